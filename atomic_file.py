@@ -0,0 +1,15 @@
+import os
+import tempfile
+
+
+def write_atomic(path, text):
+    """Write text to path through a temp file and a rename, so readers never see half a file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
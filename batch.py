@@ -0,0 +1,90 @@
+import csv
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
+MANIFEST_EXTENSIONS = ('.csv', '.txt', '.jsonl')
+
+
+def pair_csv(image_path, default_csv):
+    """A CSV next to the image with the same name wins over the shared one"""
+    sibling = os.path.splitext(image_path)[0] + '.csv'
+    return sibling if os.path.exists(sibling) else default_csv
+
+
+def read_manifest(path, default_csv=None):
+    """
+    Read (image_path, csv_path) pairs from a manifest. Lines are either JSON objects with
+    image_path/csv_path keys (.jsonl) or image,csv rows; relative paths are taken from the
+    manifest's directory and a missing CSV falls back to default_csv.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    resolve = lambda p: p if not p or os.path.isabs(p) else os.path.join(base, p)
+    jobs = []
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            rows = [json.loads(line) for line in f if line.strip()]
+            pairs = [(row.get('image_path'), row.get('csv_path')) for row in rows]
+        else:
+            pairs = [(row[0].strip(), row[1].strip() if len(row) > 1 else '')
+                     for row in csv.reader(f) if row and row[0].strip()]
+            # Allow a header row
+            if pairs and pairs[0][0].lower() in ('image', 'image_path'):
+                pairs = pairs[1:]
+    for image_path, csv_path in pairs:
+        jobs.append((resolve(image_path), resolve(csv_path) or default_csv))
+    return jobs
+
+
+def discover_jobs(spec, default_csv=None):
+    """Expand a directory, glob pattern or manifest file into (image_path, csv_path) pairs"""
+    if os.path.isdir(spec):
+        images = [os.path.join(spec, name) for name in sorted(os.listdir(spec))]
+    elif os.path.isfile(spec) and spec.lower().endswith(MANIFEST_EXTENSIONS):
+        return read_manifest(spec, default_csv)
+    else:
+        images = sorted(glob.glob(spec, recursive=True))
+    images = [path for path in images if path.lower().endswith(IMAGE_EXTENSIONS)]
+    return [(image_path, pair_csv(image_path, default_csv)) for image_path in images]
+
+
+def run_batch(jobs, process, workers=4, output=None, json_default=None):
+    """
+    Run process(image_path, csv_path) for every job on a thread pool and write one JSON line
+    per job as soon as it finishes; json_default serialises whatever process returns.
+    Returns (succeeded, failed).
+    """
+    output = output or sys.stdout
+    write_lock = threading.Lock()
+    succeeded = failed = 0
+
+    def run(index, image_path, csv_path):
+        start = time.perf_counter()
+        line = {"index": index, "image_path": image_path, "csv_path": csv_path}
+        try:
+            if not csv_path:
+                raise ValueError("No course CSV for this image")
+            line["schedule"] = process(image_path, csv_path)
+        except Exception as e:
+            line["error"] = str(e)
+        line["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return line
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(run, index, image_path, csv_path)
+                   for index, (image_path, csv_path) in enumerate(jobs)]
+        for future in as_completed(futures):
+            line = future.result()
+            if "error" in line:
+                failed += 1
+            else:
+                succeeded += 1
+            with write_lock:
+                output.write(json.dumps(line, default=json_default) + '\n')
+                output.flush()
+    return succeeded, failed
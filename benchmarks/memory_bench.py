@@ -0,0 +1,99 @@
+"""
+Memory allocated by the per-cell OCR preprocessing on a large screenshot.
+
+  rgb-pil   crop -> BGR2RGB -> PIL Image -> LANCZOS 3x (the original chain)
+  gray-roi  grayscale view -> cv2.resize 3x (what ocr_cell does now)
+
+Both prepare one cell at a time and drop it before the next, as per-cell OCR does.
+The whole-image peak of preprocess_image, which sets the process's peak RSS, is
+reported alongside.
+
+Allocations are measured with tracemalloc, which sees numpy and OpenCV buffers but
+not Pillow's own image memory, so the PIL images alive in each cell are added from
+their size (Pillow keeps RGB at 4 bytes per pixel). The resize pass's intermediate
+image is left out, which only flatters rgb-pil.
+
+Run from the repository root:
+  python -m benchmarks.memory_bench --width 3840 --height 2160
+"""
+import argparse
+import io
+import os
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+
+import cv2
+from PIL import Image
+
+VARIANTS = ['rgb-pil', 'gray-roi']
+
+
+def pil_bytes(image):
+    return image.width * image.height * 4
+
+
+def prepare_rgb_pil(image, box, scale):
+    from main import crop_cell
+    cell_img = crop_cell(image, *box)
+    pil_img = Image.fromarray(cv2.cvtColor(cell_img, cv2.COLOR_BGR2RGB))
+    new_size = (int(cell_img.shape[1] * scale), int(cell_img.shape[0] * scale))
+    resized = pil_img.resize(new_size, Image.Resampling.LANCZOS)
+    return pil_bytes(pil_img) + pil_bytes(resized)
+
+
+def prepare_gray_roi(gray, box):
+    from main import prepare_cell_image
+    prepare_cell_image(gray, *box)
+    return 0
+
+
+def measure(variant, image, gray, cells):
+    """Largest and total bytes allocated while preparing each cell"""
+    from main import OCR_SCALE_FACTOR
+    largest = total = 0
+    for _, box in cells:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        if variant == 'rgb-pil':
+            untracked = prepare_rgb_pil(image, box, OCR_SCALE_FACTOR)
+        else:
+            untracked = prepare_gray_roi(gray, box)
+        allocated = tracemalloc.get_traced_memory()[1] - start + untracked
+        largest = max(largest, allocated)
+        total += allocated
+    return largest, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory allocated by cell preprocessing variants.')
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import generate_timetable
+    from main import get_cell_regions, preprocess_image
+
+    image, _ = generate_timetable(args.width, args.height, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'timetable.png')
+        cv2.imwrite(path, image)
+        del image
+        tracemalloc.start()
+        with redirect_stdout(io.StringIO()):
+            image, gray, mask, binary = preprocess_image(path)
+            preprocess_peak = tracemalloc.get_traced_memory()[1]
+            cells, _ = get_cell_regions(mask, binary)
+
+    print(f"Cell preprocessing memory on a {args.width}x{args.height} screenshot, {len(cells)} cells")
+    print(f"  preprocess_image peak={preprocess_peak / 2**20:.1f} MB")
+    for variant in VARIANTS:
+        largest, total = measure(variant, image, gray, cells)
+        print(f"  {variant:<10} peak per cell={largest / 2**20:>6.2f} MB  "
+              f"allocated over all cells={total / 2**20:>7.1f} MB")
+    tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+End-to-end benchmark of the image-to-schedule pipeline on synthetic timetables.
+
+Every run draws timetables with known contents, times each stage of main.py,
+and reports per-stage latency percentiles, throughput and OCR accuracy.
+Results can be saved and compared against an earlier run to catch regressions.
+
+Run from the repository root (tesseract must be installed):
+  python -m benchmarks.pipeline_bench --resolutions 1280x720,1920x1080,3840x2160 --iterations 5
+  python -m benchmarks.pipeline_bench --json after.json --baseline before.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+
+import main as pipeline
+from benchmarks.synthetic import course_csv_rows, expected_schedule, generate_timetable
+from slot_lexicon import SlotLexicon
+
+STAGES = [
+    'preprocess_image',
+    'get_cell_regions',
+    'extract_text_from_cells',
+    'map_periods_to_timings',
+    'display_day_schedules',
+]
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a non-empty list"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_pipeline_timed(image_path, course_map, ocr_options, detect_width=None, detector='contours',
+                       lexicon=None):
+    """Run every stage once, returning per-stage seconds and the mapped day schedules"""
+    timings = {}
+
+    def timed(stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    image, gray, mask, binary = timed('preprocess_image', pipeline.preprocess_image, image_path, detect_width)
+    find_cells = pipeline.get_grid_cells if detector == 'grid' else pipeline.get_cell_regions
+    cells, timing_cells = timed('get_cell_regions', find_cells, mask, binary)
+    cells = pipeline.scale_cells(cells, image, mask)
+    matrix, cell_timings = timed('extract_text_from_cells', pipeline.extract_text_from_cells,
+                                 image, cells, timing_cells, gray=gray, lexicon=lexicon, **ocr_options)
+    day_schedules = timed('map_periods_to_timings', pipeline.map_periods_to_timings, matrix, cell_timings)
+    timed('display_day_schedules', pipeline.display_day_schedules, day_schedules, course_map)
+    return timings, day_schedules
+
+
+def score_schedule(day_schedules, expected):
+    """Count expected periods recovered exactly, and periods reported that were never drawn"""
+    found = {(day, code, timing) for day, periods in day_schedules.items() for code, timing in periods}
+    wanted = {(day, code, timing) for day, periods in expected.items() for code, timing in periods}
+    return len(found & wanted), len(wanted), len(found - wanted)
+
+
+def parse_resolution(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def run_benchmark(resolutions, iterations, warmup, seed, ocr_options, workdir, detect_width=None,
+                  detector='contours', correct_codes=True):
+    csv_path = os.path.join(workdir, 'courses.csv')
+    with open(csv_path, 'w', newline='') as f:
+        csv.writer(f).writerows(course_csv_rows())
+    course_map = pipeline.read_course_codes(csv_path)
+    lexicon = SlotLexicon.from_course_map(course_map) if correct_codes else None
+
+    report = {"options": dict(ocr_options, detect_width=detect_width, detector=detector,
+                                       correct_codes=correct_codes), "resolutions": {}}
+    for width, height in resolutions:
+        stage_samples = {stage: [] for stage in STAGES}
+        totals = []
+        correct = wanted = extra = 0
+
+        for iteration in range(warmup + iterations):
+            image, cells = generate_timetable(width, height, seed=seed + iteration)
+            image_path = os.path.join(workdir, f"timetable-{width}x{height}-{iteration}.png")
+            cv2.imwrite(image_path, image)
+
+            timings, day_schedules = run_pipeline_timed(image_path, course_map, ocr_options,
+                                                        detect_width, detector, lexicon)
+            if iteration < warmup:
+                continue
+            for stage in STAGES:
+                stage_samples[stage].append(timings[stage])
+            totals.append(sum(timings.values()))
+
+            hit, expected_count, spurious = score_schedule(day_schedules, expected_schedule(cells))
+            correct += hit
+            wanted += expected_count
+            extra += spurious
+
+        report["resolutions"][f"{width}x{height}"] = {
+            "iterations": iterations,
+            "throughput_per_s": iterations / sum(totals),
+            "total_ms": {f"p{p}": percentile(totals, p) * 1000 for p in PERCENTILES},
+            "stages_ms": {
+                stage: {f"p{p}": percentile(samples, p) * 1000 for p in PERCENTILES}
+                for stage, samples in stage_samples.items()
+            },
+            "accuracy": correct / wanted if wanted else 1.0,
+            "spurious_periods": extra
+        }
+    return report
+
+
+def print_report(report):
+    for resolution, result in report["resolutions"].items():
+        print(f"\n{resolution}  ({result['iterations']} runs, "
+              f"{result['throughput_per_s']:.2f} timetables/s, "
+              f"accuracy {result['accuracy'] * 100:.1f}%, "
+              f"{result['spurious_periods']} spurious periods)")
+        print(f"  {'stage':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, values in result["stages_ms"].items():
+            print(f"  {stage:<26}{values['p50']:>10.1f}{values['p95']:>10.1f}{values['p99']:>10.1f}")
+        total = result["total_ms"]
+        print(f"  {'total':<26}{total['p50']:>10.1f}{total['p95']:>10.1f}{total['p99']:>10.1f}")
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """Return a list of regressions: slower p50 beyond tolerance, or lower accuracy"""
+    regressions = []
+    for resolution, result in report["resolutions"].items():
+        previous = baseline["resolutions"].get(resolution)
+        if not previous:
+            continue
+        for stage, values in result["stages_ms"].items():
+            before = previous["stages_ms"].get(stage, {}).get("p50")
+            # Sub-millisecond stages are too noisy to compare
+            if before and before >= 1 and values["p50"] > before * (1 + tolerance):
+                regressions.append(f"{resolution} {stage}: p50 {before:.1f} ms -> {values['p50']:.1f} ms")
+        if result["accuracy"] < previous["accuracy"]:
+            regressions.append(f"{resolution} accuracy: {previous['accuracy'] * 100:.1f}% -> "
+                               f"{result['accuracy'] * 100:.1f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the timetable pipeline on synthetic images.')
+    parser.add_argument('--resolutions', default='1280x720,1920x1080,3840x2160',
+                        help='Comma-separated WIDTHxHEIGHT list')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed runs per resolution')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per resolution')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--batch-ocr', action='store_true')
+    parser.add_argument('--no-early-exit', action='store_true')
+    parser.add_argument('--ocr-backend', default='auto')
+    parser.add_argument('--detect-width', type=int, default=None,
+                        help='Find cells on a copy downscaled to this width')
+    parser.add_argument('--detector', choices=pipeline.DETECTORS, default='contours')
+    parser.add_argument('--no-code-correction', action='store_true')
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--baseline', help='Earlier --json report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Allowed p50 slowdown against the baseline (0.15 = 15%%)')
+    args = parser.parse_args()
+
+    # Measure the production configuration: no diagnostics, no debug image
+    pipeline.set_verbose(False)
+    ocr_options = {
+        'workers': args.workers,
+        'batch_ocr': args.batch_ocr,
+        'early_exit': not args.no_early_exit,
+        'ocr_backend': args.ocr_backend
+    }
+    resolutions = [parse_resolution(value) for value in args.resolutions.split(',')]
+
+    with tempfile.TemporaryDirectory(prefix='autott-bench-') as workdir:
+        report = run_benchmark(resolutions, args.iterations, args.warmup, args.seed, ocr_options, workdir,
+                               args.detect_width, args.detector, not args.no_code_correction)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == '__main__':
+    main()
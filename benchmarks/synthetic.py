@@ -0,0 +1,130 @@
+import random
+
+import cv2
+import numpy as np
+
+from main import DAYS, LAB_SLOTS, THEORY_SLOTS
+
+SLOTS_PER_ROW = 12
+
+YELLOW = (0, 255, 255)     # BGR, theory cells
+GREEN = (144, 238, 144)    # BGR, lab cells
+HEADER = (180, 120, 40)    # BGR, blue header band
+LINE = (255, 255, 255)
+TEXT = (0, 0, 0)
+
+THEORY_SLOT_NAMES = ['A1', 'F1', 'D1', 'TB1', 'TG1', 'S11', 'A2', 'F2', 'D2', 'TB2', 'TG2', 'S3']
+
+COURSES = [
+    ('BCSE301', 'Software Engineering'),
+    ('BCSE302', 'Database Systems'),
+    ('BCSE303', 'Operating Systems'),
+    ('BCSE304', 'Theory of Computation'),
+    ('BCSE305', 'Embedded Systems'),
+    ('BMAT202', 'Probability and Statistics'),
+    ('BSTS301', 'Advanced Competitive Coding'),
+    ('BHUM101', 'Economics'),
+]
+
+
+def period_code(slot, course, row_type, rng):
+    """Build a period code matching the pattern map_periods_to_timings accepts"""
+    if row_type == 'lab':
+        course_code, kind = f"{course}P", 'LO'
+    else:
+        course_code, kind = f"{course}L", rng.choice(['TH', 'ETH'])
+    room = f"{rng.randint(100, 799)}{rng.choice(['', '', 'A', 'B'])}"
+    return f"{slot}-{course_code}-{kind}-AB{rng.randint(1, 3)}-{room}-ALL"
+
+
+def wrap_code(code):
+    """Split a code over three lines the way the timetable portal wraps it"""
+    parts = code.split('-')
+    return [f"{parts[0]}-{parts[1]}-", f"{parts[2]}-{parts[3]}-{parts[4]}-", '-'.join(parts[5:])]
+
+
+def draw_lines(image, lines, x, y, w, h):
+    scale = h / 90.0
+    thickness = max(1, int(round(scale * 1.5)))
+    line_height = h / (len(lines) + 1)
+    for index, line in enumerate(lines):
+        (text_w, text_h), _ = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+        if text_w > w * 0.92:
+            scale *= (w * 0.92) / text_w
+            (text_w, text_h), _ = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+        origin = (int(x + (w - text_w) / 2), int(y + line_height * (index + 1) + text_h / 2))
+        cv2.putText(image, line, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, TEXT, thickness, cv2.LINE_AA)
+
+
+def generate_timetable(width=1920, height=1080, days=7, occupancy=0.35, blank_ratio=0.3, seed=0):
+    """
+    Draw a synthetic timetable screenshot.
+    Returns the BGR image and a list of (day_index, row_type, slot_index, period_code or None)
+    for every highlighted cell.
+    """
+    rng = random.Random(seed)
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    # Two header rows (theory and lab timings) above two rows per day
+    rows = 2 + days * 2
+    row_height = height / rows
+    label_width = width * 0.1
+    # Twelve slots plus a lunch column between slot 6 and slot 7
+    col_width = (width - label_width) / (SLOTS_PER_ROW + 1)
+    gap = max(2, int(round(min(row_height, col_width) * 0.05)))
+
+    cv2.rectangle(image, (0, 0), (width - 1, int(row_height * 2) - 1), HEADER, -1)
+
+    cells = []
+    for day in range(days):
+        for row_offset, row_type in enumerate(('theory', 'lab')):
+            top = int((2 + day * 2 + row_offset) * row_height)
+            bottom = int((3 + day * 2 + row_offset) * row_height)
+            label = DAYS[day] if row_type == 'theory' else 'LAB'
+            draw_lines(image, [label], 0, top, int(label_width), bottom - top)
+            for slot in range(SLOTS_PER_ROW):
+                column = slot if slot < 6 else slot + 1
+                left = int(label_width + column * col_width)
+                right = int(label_width + (column + 1) * col_width)
+                x, y = left + gap, top + gap
+                w, h = right - left - 2 * gap, bottom - top - 2 * gap
+                cv2.rectangle(image, (x, y), (x + w, y + h), YELLOW if row_type == 'theory' else GREEN, -1)
+
+                if row_type == 'theory':
+                    slot_name = THEORY_SLOT_NAMES[slot]
+                else:
+                    slot_name = f"L{day * SLOTS_PER_ROW + slot + 1}"
+
+                code = None
+                roll = rng.random()
+                if roll < occupancy:
+                    course, _ = rng.choice(COURSES)
+                    code = period_code(slot_name, course, row_type, rng)
+                    draw_lines(image, wrap_code(code), x, y, w, h)
+                elif roll < occupancy + (1 - occupancy) * (1 - blank_ratio):
+                    draw_lines(image, [slot_name], x, y, w, h)
+                cells.append((day, row_type, slot, code))
+
+    # White separators between rows
+    for row in range(rows + 1):
+        cv2.line(image, (0, int(row * row_height)), (width, int(row * row_height)), LINE, gap)
+    return image, cells
+
+
+def course_csv_rows():
+    """Rows for a course CSV matching the synthetic timetables, header included"""
+    rows = [['Course Code', 'Course Title']]
+    for course, name in COURSES:
+        rows.append([f"{course}L", name])
+        rows.append([f"{course}P", name])
+    return rows
+
+
+def expected_schedule(cells):
+    """Ground truth in the shape map_periods_to_timings returns: {day: [(period_code, timing)]}"""
+    schedule = {day: [] for day in DAYS}
+    for day, row_type, slot, code in cells:
+        if code:
+            timing = (LAB_SLOTS if row_type == 'lab' else THEORY_SLOTS)[slot]
+            schedule[DAYS[day]].append((code, timing))
+    return schedule
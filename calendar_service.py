@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import DISCOVERY_URI, build_from_document
+from googleapiclient.http import build_http
+
+from atomic_file import write_atomic
+
+# Discovery document to build the Calendar client from instead of Google's, e.g. a local fake
+# Calendar server whose document points rootUrl at itself
+CALENDAR_DISCOVERY_URL = os.environ.get('AUTOTT_CALENDAR_DISCOVERY_URL')
+
+# Fetched discovery documents are kept here, so later starts need no network round-trip for them
+DISCOVERY_CACHE_DIR = os.environ.get('AUTOTT_DISCOVERY_CACHE') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.discovery_cache')
+
+# Refresh the access token once less than this is left on it
+REFRESH_MARGIN = timedelta(minutes=5)
+
+EXPIRY_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+_documents = {}
+_sessions = {}
+_sessions_lock = threading.Lock()
+_background_refresh = False
+
+
+def discovery_url():
+    return CALENDAR_DISCOVERY_URL or DISCOVERY_URI.format(api='calendar', apiVersion='v3')
+
+
+def load_discovery_document(url=None):
+    """The Calendar v3 discovery document, fetched the first time and read from DISCOVERY_CACHE_DIR after"""
+    url = url or discovery_url()
+    if url in _documents:
+        return _documents[url]
+    path = os.path.join(DISCOVERY_CACHE_DIR, f"calendar.v3.{hashlib.sha1(url.encode()).hexdigest()[:12]}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            document = f.read()
+    else:
+        resp, content = build_http().request(url)
+        if resp.status >= 400:
+            raise RuntimeError(f"Failed to fetch the Calendar discovery document: HTTP {resp.status}")
+        document = content.decode('utf-8')
+        # Never cache something that isn't a discovery document
+        if 'rootUrl' not in json.loads(document):
+            raise RuntimeError("The Calendar discovery document has no rootUrl")
+        os.makedirs(DISCOVERY_CACHE_DIR, exist_ok=True)
+        write_atomic(path, document)
+    _documents[url] = document
+    return document
+
+
+def load_credentials(token_path, scopes):
+    """Credentials from token.json, keeping the saved access token while it is still good"""
+    with open(token_path) as f:
+        info = json.load(f)
+    creds = Credentials.from_authorized_user_info(info, scopes)
+    # Older google-auth drops the access token here, which would force a refresh on every start
+    if creds.token is None and info.get('token') and info.get('expiry'):
+        creds.token = info['token']
+        creds.expiry = datetime.strptime(info['expiry'].rstrip('Z').split('.')[0], EXPIRY_FORMAT)
+    return creds
+
+
+def save_credentials(creds, token_path):
+    """Write token.json, with the access token's expiry so the next process can reuse it"""
+    info = json.loads(creds.to_json())
+    if creds.expiry:
+        info['expiry'] = creds.expiry.strftime(EXPIRY_FORMAT)
+    write_atomic(token_path, json.dumps(info))
+
+
+class CalendarSession:
+    """Credentials, one keep-alive authorized connection and the Calendar client built on it"""
+
+    def __init__(self, creds, token_path):
+        self.creds = creds
+        self.token_path = token_path
+        self.token_mtime = os.path.getmtime(token_path)
+        self.http = AuthorizedHttp(creds, http=build_http())
+        self.closed = False
+        self._service = None
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def calendar(self):
+        with self._lock:
+            if self._service is None:
+                self._service = build_from_document(load_discovery_document(), http=self.http)
+            return self._service
+
+    def expiring(self, margin=REFRESH_MARGIN):
+        if not self.creds.token:
+            return True
+        return self.creds.expiry is not None and self.creds.expiry - margin <= datetime.utcnow()
+
+    def refresh_if_expiring(self, margin=REFRESH_MARGIN):
+        """Refresh ahead of expiry so requests never stop to do it; False when refreshing failed"""
+        with self._lock:
+            if not self.expiring(margin):
+                return True
+            try:
+                self.creds.refresh(Request())
+            except Exception:
+                return False
+            save_credentials(self.creds, self.token_path)
+            self.token_mtime = os.path.getmtime(self.token_path)
+            return True
+
+    def start_refresher(self, margin=REFRESH_MARGIN):
+        """Keep the token fresh from a background thread, for long-running processes"""
+        if self._refresher is not None:
+            return
+
+        def run():
+            while not self.closed:
+                expiry = self.creds.expiry
+                wait = (expiry - margin - datetime.utcnow()).total_seconds() if expiry else 600
+                time.sleep(min(600, max(30, wait)))
+                if not self.closed:
+                    self.refresh_if_expiring(margin)
+
+        self._refresher = threading.Thread(target=run, name='calendar-token-refresh', daemon=True)
+        self._refresher.start()
+
+    def close(self):
+        self.closed = True
+
+
+def enable_background_refresh():
+    """Have every session refresh its token in the background (for ocr_server and other long-lived processes)"""
+    global _background_refresh
+    _background_refresh = True
+
+
+def get_session(credentials_dir, scopes):
+    """
+    The cached CalendarSession for credentials_dir, or None when nobody is logged in.
+    A session is rebuilt whenever token.json is replaced or removed outside it.
+    """
+    token_path = os.path.join(credentials_dir, 'token.json')
+    with _sessions_lock:
+        session = _sessions.get(token_path)
+        mtime = os.path.getmtime(token_path) if os.path.exists(token_path) else None
+        if session is not None and session.token_mtime != mtime:
+            session.close()
+            del _sessions[token_path]
+            session = None
+        if mtime is None:
+            return None
+        if session is None:
+            session = CalendarSession(load_credentials(token_path, scopes), token_path)
+            _sessions[token_path] = session
+    if _background_refresh:
+        session.start_refresher()
+    return session
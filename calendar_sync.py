@@ -3,18 +3,49 @@ import datetime
 import os.path
 import json
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.http import build_http
 from main import main as process_timetable
 from datetime import datetime, timedelta
 import os
 from google_credentials import ensure_credentials_file
+from calendar_service import get_session, save_credentials
+from rate_limit import MAX_RETRIES, TokenBucket, backoff_delay, call_with_backoff, error_status, is_rate_limited
+from sync_index import (EVENT_KEY_PROPERTY, EVENT_SOURCE_PROPERTY, body_hash, event_id, event_key, load_index,
+                        plan_sync, remove_index, save_index)
 
 # Scope for calendar access
 SCOPES = ['https://www.googleapis.com/auth/calendar.events']
 
+# The Calendar API takes at most 50 calls in one batch request
+CALENDAR_BATCH_SIZE = 50
+
+# Stay under Calendar's per-user quota of 600 queries a minute: 10 a second on average, with
+# bursts of one full batch. Every call inside a batch counts against the quota on its own.
+CALENDAR_QPS = 10
+CALENDAR_BURST = 50
+CALENDAR_WORKERS = 4
+
+# 'batch' sends events in batch requests; 'concurrent' sends one request per event from
+# CALENDAR_WORKERS threads, for setups where batch requests are blocked or failing
+CALENDAR_ENGINE = os.environ.get('AUTOTT_CALENDAR_ENGINE', 'batch')
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+WEEKDAY_CODES = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+WEEKDAYS = {
+    # Full names
+    'MONDAY': 0, 'TUESDAY': 1, 'WEDNESDAY': 2,
+    'THURSDAY': 3, 'FRIDAY': 4, 'SATURDAY': 5, 'SUNDAY': 6,
+    # Abbreviated names
+    'MON': 0, 'TUE': 1, 'WED': 2,
+    'THU': 3, 'FRI': 4, 'SAT': 5, 'SUN': 6
+}
+
 def get_auth_url(credentials_dir=None):
     """Get the authorization URL and store the flow state"""
     if credentials_dir is None:
@@ -105,8 +136,7 @@ def complete_auth(auth_code, credentials_dir=None):
             creds = flow.credentials
             
             # Save the credentials
-            with open(token_path, 'w') as token:
-                token.write(creds.to_json())
+            save_credentials(creds, token_path)
                 
             # Clean up the state file
             os.remove(state_path)
@@ -128,14 +158,14 @@ def complete_auth(auth_code, credentials_dir=None):
         }
 
 def get_google_calendar_service(credentials_dir=None):
-    """Get Google Calendar service with configurable credentials directory"""
-    creds = None
-    
+    """
+    Get Google Calendar service with configurable credentials directory. The service, its
+    connection and the credentials are cached per directory and reused by later calls.
+    """
     # Use provided credentials directory or default to script directory
     if credentials_dir is None:
         credentials_dir = os.path.dirname(os.path.abspath(__file__))
     
-    token_path = os.path.join(credentials_dir, 'token.json')
     credentials_path = os.path.join(credentials_dir, 'credentials.json')
 
     if not os.path.exists(credentials_path):
@@ -145,38 +175,24 @@ def get_google_calendar_service(credentials_dir=None):
         }
 
     # Load token if it exists
-    if os.path.exists(token_path):
-        try:
-            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-        except Exception as e:
-            return {
-                "error": f"Failed to load existing credentials: {str(e)}",
-                "success": False
-            }
+    try:
+        session = get_session(credentials_dir, SCOPES)
+    except Exception as e:
+        return {
+            "error": f"Failed to load existing credentials: {str(e)}",
+            "success": False
+        }
 
-    # Check if credentials need refresh or new auth
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-                # Save refreshed credentials
-                with open(token_path, 'w') as token:
-                    token.write(creds.to_json())
-            except Exception as e:
-                # If refresh fails, we need new authentication
-                creds = None
-        
-        # If no valid credentials available, return needs_auth
-        if not creds:
-            return {
-                "error": "Authentication required",
-                "success": False,
-                "needs_auth": True
-            }
+    # Refresh ahead of expiry; if there is no token or refresh fails, we need new authentication
+    if session is None or not session.refresh_if_expiring():
+        return {
+            "error": "Authentication required",
+            "success": False,
+            "needs_auth": True
+        }
 
     try:
-        service = build('calendar', 'v3', credentials=creds)
-        return service
+        return session.calendar()
     except Exception as e:
         return {
             "error": f"Failed to build calendar service: {str(e)}",
@@ -185,19 +201,10 @@ def get_google_calendar_service(credentials_dir=None):
 
 def get_next_weekday(start_date, day_name):
     """Get the next date for a given day name from the start date."""
-    weekdays = {
-        # Full names
-        'MONDAY': 0, 'TUESDAY': 1, 'WEDNESDAY': 2, 
-        'THURSDAY': 3, 'FRIDAY': 4, 'SATURDAY': 5, 'SUNDAY': 6,
-        # Abbreviated names
-        'MON': 0, 'TUE': 1, 'WED': 2, 
-        'THU': 3, 'FRI': 4, 'SAT': 5, 'SUN': 6
-    }
-    
     try:
-        target_weekday = weekdays[day_name]
+        target_weekday = WEEKDAYS[day_name]
     except KeyError:
-        print(f"Error: Unknown day format '{day_name}'. Available formats: {', '.join(weekdays.keys())}")
+        print(f"Error: Unknown day format '{day_name}'. Available formats: {', '.join(WEEKDAYS.keys())}")
         return None
         
     start_weekday = start_date.weekday()
@@ -267,7 +274,11 @@ def verify_schedule_data(day_schedules):
         else:
             print("Please enter 1 or 2")
 
-def create_calendar_event(service, period_info, event_date, is_recurring=True):
+def build_event_body(period_info, event_date, is_recurring=True, weekdays=None):
+    """
+    Build the Calendar API event resource for one period on event_date. A recurring event
+    repeats on event_date's weekday, or on every weekday number in weekdays.
+    """
     # Parse the time range
     start_time, end_time = period_info['time'].split('-')
     
@@ -275,22 +286,6 @@ def create_calendar_event(service, period_info, event_date, is_recurring=True):
     start_hour, start_minute = map(int, start_time.split(':'))
     end_hour, end_minute = map(int, end_time.split(':'))
     
-    # Add 30 minutes to correct the offset
-    start_minute += 0
-    end_minute += 0
-    start_hour += 0
-    end_hour += 0
-    
-    # Handle minute overflow
-    if start_minute >= 60:
-        start_hour += 1
-        start_minute -= 60
-    if end_minute >= 60:
-        end_hour += 1
-        end_minute -= 60
-    
-    # Add 5 hours and 30 minutes to compensate for timezone conversion
-    
     # Handle hour overflow
     start_date = event_date
     end_date = event_date
@@ -305,17 +300,10 @@ def create_calendar_event(service, period_info, event_date, is_recurring=True):
     start_datetime = f"{start_date.strftime('%Y-%m-%d')}T{start_hour:02d}:{start_minute:02d}:00"
     end_datetime = f"{end_date.strftime('%Y-%m-%d')}T{end_hour:02d}:{end_minute:02d}:00"
     
-    # Get the weekday number (0 = Monday, 6 = Sunday)
-    weekday = event_date.weekday()
-    weekday_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    weekday_codes = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
-    
-    # Use the course name directly from period_info as it's already properly formatted with Lab suffix if needed
-    course_name = period_info['course_name']
-    
-    # Create the event
+    # Create the event, using the course name directly from period_info as it's already
+    # properly formatted with Lab suffix if needed
     event = {
-        'summary': course_name,
+        'summary': period_info['course_name'],
         'location': period_info['location'],
         'description': f"Course Code: {period_info['course_code']}",
         'start': {
@@ -330,31 +318,174 @@ def create_calendar_event(service, period_info, event_date, is_recurring=True):
     
     # Add recurrence rule if recurring
     if is_recurring:
+        byday = ','.join(WEEKDAY_CODES[weekday] for weekday in (weekdays or [event_date.weekday()]))
         event['recurrence'] = [
-            f'RRULE:FREQ=WEEKLY;BYDAY={weekday_codes[weekday]}'
+            f'RRULE:FREQ=WEEKLY;BYDAY={byday}'
         ]
+    return event
 
+def group_recurring_periods(units):
+    """
+    Group (day, period, is_recurring) units so a weekly course at the same time and place on
+    several days becomes one event repeating on all of them. One-time periods stay on their own.
+    Returns (days in week order, periods, is_recurring) for each group.
+    """
+    groups = {}
+    for day, period, is_recurring in units:
+        key = (period['actual_code'], period['course_name'], period['time'], period['location'])
+        if not is_recurring:
+            key = (day, len(groups)) + key
+        # A second identical period on the same day starts a group of its own
+        while key in groups and day in groups[key][0]:
+            key += ('+',)
+        days, periods, _ = groups.setdefault(key, ([], [], is_recurring))
+        days.append(day)
+        periods.append(period)
+    grouped = []
+    for days, periods, is_recurring in groups.values():
+        order = sorted(range(len(days)), key=lambda i: WEEKDAYS.get(days[i], 7))
+        grouped.append(([days[i] for i in order], [periods[i] for i in order], is_recurring))
+    return grouped
+
+def group_period_info(periods):
+    """One period standing in for a group; every distinct period code goes into the description"""
+    codes = list(dict.fromkeys(period['course_code'] for period in periods))
+    return dict(periods[0], course_code=', '.join(codes))
+
+def print_event_details(event, event_date, is_recurring=True):
+    rule = event.get('recurrence', [''])[0]
+    codes = rule.split('BYDAY=')[1].split(',') if 'BYDAY=' in rule else [WEEKDAY_CODES[event_date.weekday()]]
+    weekday_name = ', '.join(WEEKDAY_NAMES[WEEKDAY_CODES.index(code)] for code in codes)
+    date = event_date.strftime('%Y-%m-%d')
+    start_datetime = event['start']['dateTime']
+    end_datetime = event['end']['dateTime']
     print(f"  Event details:")
-    print(f"    Course: {course_name}")
-    print(f"    Date: {event_date.strftime('%Y-%m-%d')}")
-    print(f"    Original Time: {start_time} - {end_time} IST")
-    print(f"    Adjusted Time: {start_hour:02d}:{start_minute:02d} - {end_hour:02d}:{end_minute:02d} IST")
-    if start_date != event_date or end_date != event_date:
+    print(f"    Course: {event['summary']}")
+    print(f"    Date: {date}")
+    print(f"    Time: {start_datetime[11:16]} - {end_datetime[11:16]} IST")
+    if start_datetime[:10] != date or end_datetime[:10] != date:
         print(f"    Note: Event spans to next day")
     if is_recurring:
-        print(f"    Repeats: Every {weekday_names[weekday]}")
+        print(f"    Repeats: Every {weekday_name}")
     else:
-        print(f"    One-time event on {weekday_names[weekday]}")
-    print(f"    Location: {period_info['location']}")
+        print(f"    One-time event on {weekday_name}")
+    print(f"    Location: {event['location']}")
+
+def create_calendar_event(service, period_info, event_date, is_recurring=True, weekdays=None):
+    event = build_event_body(period_info, event_date, is_recurring, weekdays)
+    print_event_details(event, event_date, is_recurring)
     
     try:
-        event_result = service.events().insert(calendarId='primary', body=event).execute()
+        event_result = call_with_backoff(service.events().insert(calendarId='primary', body=event).execute)
         print(f"  Success! Event link: {event_result.get('htmlLink')}")
         return True
     except Exception as e:
         print(f"  Failed to create event: {str(e)}")
         return False
 
+def event_request(service, method, params):
+    """An events() request on the primary calendar, e.g. ('insert', {'body': ...})"""
+    return getattr(service.events(), method)(calendarId='primary', **params)
+
+def execute_event_calls_batch(service, calls, batch_size=CALENDAR_BATCH_SIZE, bucket=None):
+    """
+    Run (method, params) events() calls through Calendar API batch requests, up to batch_size
+    calls per HTTP round-trip. Calls refused for rate limiting are sent again in a later batch
+    after a backoff. Returns (response, None) or (None, exception) for each call, in order.
+    """
+    bucket = bucket or TokenBucket(CALENDAR_QPS, CALENDAR_BURST)
+    results = [(None, RuntimeError("No response for this call in the batch"))] * len(calls)
+    pending = list(range(len(calls)))
+
+    for attempt in range(MAX_RETRIES + 1):
+        retry = []
+        last_error = None
+
+        def on_response(request_id, response, exception):
+            nonlocal last_error
+            index = int(request_id)
+            if exception is not None:
+                results[index] = (None, exception)
+                if is_rate_limited(exception):
+                    retry.append(index)
+                    last_error = exception
+            else:
+                results[index] = (response, None)
+
+        for offset in range(0, len(pending), batch_size):
+            indexes = pending[offset:offset + batch_size]
+            bucket.acquire(len(indexes))
+            batch = service.new_batch_http_request(callback=on_response)
+            for index in indexes:
+                batch.add(event_request(service, *calls[index]), request_id=str(index))
+            try:
+                batch.execute()
+            except Exception as e:
+                # The batch request itself failed, so none of its calls went through
+                for index in indexes:
+                    results[index] = (None, e)
+                if is_rate_limited(e):
+                    retry.extend(indexes)
+                    last_error = e
+
+        if not retry or attempt == MAX_RETRIES:
+            break
+        time.sleep(backoff_delay(attempt, last_error))
+        pending = sorted(retry)
+    return results
+
+def execute_event_calls_concurrent(service, calls, credentials, workers=CALENDAR_WORKERS, bucket=None):
+    """
+    Run (method, params) events() calls from a pool of worker threads, paced by a token bucket and
+    retrying rate-limited calls with backoff. Each thread authorizes its own connection with
+    credentials. Returns results in the same shape as execute_event_calls_batch.
+    """
+    bucket = bucket or TokenBucket(CALENDAR_QPS, CALENDAR_BURST)
+    # Refresh once up front rather than in every worker at the same time
+    if not credentials.valid:
+        credentials.refresh(Request())
+    # httplib2 connections are not thread-safe, so each worker gets its own
+    local = threading.local()
+
+    def execute(call):
+        if not hasattr(local, 'http'):
+            local.http = AuthorizedHttp(credentials, http=build_http())
+
+        def attempt():
+            bucket.acquire()
+            return event_request(service, *call).execute(http=local.http)
+
+        try:
+            return call_with_backoff(attempt), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(execute, calls))
+
+def list_synced_event_ids(service):
+    """Ids of the events earlier syncs created that are still in the calendar"""
+    ids = set()
+    page_token = None
+    while True:
+        response = service.events().list(
+            calendarId='primary',
+            privateExtendedProperty=f"{EVENT_SOURCE_PROPERTY}=autott",
+            fields='items(id),nextPageToken',
+            maxResults=2500,
+            pageToken=page_token
+        ).execute()
+        ids.update(item['id'] for item in response.get('items', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return ids
+
+def tag_event_body(key, body):
+    """Give an event its deterministic id and mark it as ours so later syncs can find it"""
+    return dict(body, id=event_id(key), status='confirmed', extendedProperties={
+        'private': {EVENT_SOURCE_PROPERTY: 'autott', EVENT_KEY_PROPERTY: key}
+    })
+
 def sync_timetable_to_calendar(image_path, csv_path, start_date_str="2024-06-04"):
     """
     Syncs the timetable to Google Calendar
@@ -391,21 +522,22 @@ def sync_timetable_to_calendar(image_path, csv_path, start_date_str="2024-06-04"
     start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
     print(f"\nEvents will be created starting from: {start_date_str}")
     events_created = 0
+    units = []
     
-    # Process each selected day's schedule using the already verified day_schedules
+    # Collect each selected day's schedule using the already verified day_schedules
     for day in selected_days:
-        # Get the next occurrence of this weekday
-        event_date = get_next_weekday(start_date, day)
-        if event_date is None:
+        if get_next_weekday(start_date, day) is None:
             print(f"Skipping {day}'s schedule due to invalid day format")
             continue
-            
-        print(f"\nProcessing {day}'s schedule...")
-        
-        schedule = day_schedules[day]
-        for period in schedule:
-            if create_calendar_event(service, period, event_date, is_recurring):
-                events_created += 1
+        units.extend((day, period, is_recurring) for period in day_schedules[day])
+
+    # The same class on several days becomes one event repeating on each of them
+    for days, periods, _ in group_recurring_periods(units):
+        print(f"\nProcessing {periods[0]['course_name']} on {', '.join(days)}...")
+        event_dates = [get_next_weekday(start_date, day) for day in days]
+        if create_calendar_event(service, group_period_info(periods), min(event_dates), is_recurring,
+                                 [event_date.weekday() for event_date in event_dates]):
+            events_created += 1
 
     print(f"\nSummary: Created {events_created} {'recurring' if is_recurring else 'one-time'} events for {', '.join(selected_days)}")
     if is_recurring:
@@ -418,7 +550,8 @@ def is_valid_date(date_str):
     except ValueError:
         return False
 
-def sync_from_web(schedule_json_path, selected_days=None, is_recurring=True, credentials_dir=None, start_date_str=None):
+def sync_from_web(schedule_json_path, selected_days=None, is_recurring=True, credentials_dir=None, start_date_str=None,
+                  batched=None, workers=CALENDAR_WORKERS):
     """
     Syncs schedule to calendar from web interface using saved JSON file
     Args:
@@ -427,7 +560,16 @@ def sync_from_web(schedule_json_path, selected_days=None, is_recurring=True, cre
         is_recurring: Whether to create recurring events
         credentials_dir: Directory containing Google Calendar credentials
         start_date_str: Start date in YYYY-MM-DD format (defaults to today)
+        batched: Send the events in Calendar API batch requests instead of one request each
+                 (defaults to CALENDAR_ENGINE)
+        workers: Concurrent requests when not batched
+
+    Events get ids derived from (day, slot, course) and are recorded in sync_index.json in
+    credentials_dir, so syncing again only creates, updates or removes what changed.
     """
+    if credentials_dir is None:
+        credentials_dir = os.path.dirname(os.path.abspath(__file__))
+
     try:
         # Read the schedule from the JSON file
         with open(schedule_json_path, 'r') as f:
@@ -467,6 +609,9 @@ def sync_from_web(schedule_json_path, selected_days=None, is_recurring=True, cre
                     "auth_url": auth_result['auth_url']
                 }
             return service
+        credentials = get_session(credentials_dir, SCOPES).creds
+        if batched is None:
+            batched = CALENDAR_ENGINE != 'concurrent'
 
         # Set start date
         if start_date_str and is_valid_date(start_date_str):
@@ -474,39 +619,128 @@ def sync_from_web(schedule_json_path, selected_days=None, is_recurring=True, cre
         else:
             start_date = datetime.now()
 
-        events_created = 0
-        summary = []
         errors = []
+        units = []
 
-        # Process each selected day's schedule
+        # Forget events that were deleted from the calendar since the last sync so they are made again
+        index = load_index(credentials_dir)
+        if index:
+            try:
+                remaining = list_synced_event_ids(service)
+                index = {key: entry for key, entry in index.items() if entry['id'] in remaining}
+            except Exception as e:
+                errors.append(f"Could not check existing events: {str(e)}")
+
+        # Collect every selected day's periods first so only the difference needs sending
         for day in selected_days:
             if day not in day_schedules:
                 continue
-
-            # Get the next occurrence of this weekday
-            event_date = get_next_weekday(start_date, day)
-            if event_date is None:
+            if get_next_weekday(start_date, day) is None:
                 errors.append(f"Could not determine date for {day}")
                 continue
-
-            schedule = day_schedules[day]
-            for period in schedule:
-                if create_calendar_event(service, period, event_date, is_recurring):
-                    events_created += 1
+            units.extend((day, period, is_recurring) for period in day_schedules[day])
+
+        # An event repeating on some selected and some unselected days is rebuilt, so keep the
+        # unselected days' periods as they were
+        for entry in index.values():
+            if set(entry['days']) & set(selected_days) and not set(entry['days']) <= set(selected_days):
+                units.extend((day, period, True) for day, period in entry['periods'] if day not in selected_days)
+
+        # The same weekly class on several days becomes one event repeating on each of them
+        wanted = {}
+        for days, periods, recurring in group_recurring_periods(units):
+            key = event_key('+'.join(days), periods[0])
+            while key in wanted:
+                key += '+'
+            event_dates = [get_next_weekday(start_date, day) for day in days]
+            body = build_event_body(group_period_info(periods), min(event_dates), recurring,
+                                    [event_date.weekday() for event_date in event_dates])
+            wanted[key] = (days, periods, body)
+
+        # A new start date only moves recurring events when it was asked for explicitly
+        pin_dates = bool(start_date_str) or not is_recurring
+        inserts, updates, deletes, unchanged = plan_sync(
+            index, {key: (days, body) for key, (days, _, body) in wanted.items()}, selected_days, pin_dates)
+
+        calls = ([('insert', {'body': tag_event_body(key, wanted[key][2])}) for key in inserts] +
+                 [('update', {'eventId': index[key]['id'], 'body': tag_event_body(key, wanted[key][2])})
+                  for key in updates] +
+                 [('delete', {'eventId': index[key]['id']}) for key in deletes])
+        operations = [('insert', key) for key in inserts] + [('update', key) for key in updates] + \
+                     [('delete', key) for key in deletes]
+
+        # One bucket for the whole sync, so resubmitted calls don't start with a fresh burst
+        bucket = TokenBucket(CALENDAR_QPS, CALENDAR_BURST)
+
+        def submit(calls):
+            if batched:
+                return execute_event_calls_batch(service, calls, bucket=bucket)
+            return execute_event_calls_concurrent(service, calls, credentials, workers, bucket)
+
+        results = submit(calls) if calls else []
+
+        # An insert whose id already exists (made by a sync this index doesn't know about, or deleted
+        # since) becomes an update; an update of an event that is gone becomes an insert
+        fallbacks = []
+        for position, ((operation, key), (_, error)) in enumerate(zip(operations, results)):
+            status = error_status(error) if error is not None else None
+            body = tag_event_body(key, wanted[key][2]) if operation != 'delete' else None
+            if operation == 'insert' and status == 409:
+                fallbacks.append((position, ('update', {'eventId': body['id'], 'body': body})))
+            elif operation == 'update' and status in (404, 410):
+                fallbacks.append((position, ('insert', {'body': body})))
+            elif operation == 'delete' and status in (404, 410):
+                results[position] = (None, None)
+        if fallbacks:
+            for (position, _), result in zip(fallbacks, submit([call for _, call in fallbacks])):
+                results[position] = result
+
+        counts = {'insert': 0, 'update': 0, 'delete': 0}
+        summary = []
+        # What actually happened to each wanted event; a failed update keeps its old index entry
+        status_by_key = {key: 'unchanged' for key in unchanged}
+        for (operation, key), (_, error) in zip(operations, results):
+            if error is not None:
+                if operation == 'delete':
+                    days, name = index[key]['days'], key
+                else:
+                    days, name = wanted[key][0], wanted[key][1][0]['course_name']
+                    status_by_key[key] = 'failed'
+                action = {'insert': 'create', 'update': 'update', 'delete': 'remove'}[operation]
+                errors.append(f"Failed to {action} event for {name} on {', '.join(days)}: {str(error)}")
+                continue
+            counts[operation] += 1
+            if operation == 'delete':
+                index.pop(key)
+            else:
+                status_by_key[key] = 'created' if operation == 'insert' else 'updated'
+                days, periods, body = wanted[key]
+                index[key] = {'id': event_id(key), 'hash': body_hash(body), 'days': days,
+                              'date': body['start']['dateTime'][:10],
+                              'periods': [[day, period] for day, period in zip(days, periods)]}
+        save_index(credentials_dir, index)
+
+        for key, (days, periods, _) in wanted.items():
+            for day, period in zip(days, periods):
+                if day in selected_days:
                     summary.append({
                         "day": day,
                         "course": period["course_name"],
                         "time": period["time"],
-                        "location": period["location"]
+                        "location": period["location"],
+                        "status": status_by_key[key]
                     })
-                else:
-                    errors.append(f"Failed to create event for {period['course_name']} on {day}")
 
+        kind = 'recurring' if is_recurring else 'one-time'
         response = {
             "success": True,
-            "events_created": events_created,
+            "events_created": counts['insert'],
+            "events_updated": counts['update'],
+            "events_deleted": counts['delete'],
+            "events_unchanged": len(unchanged),
             "summary": summary,
-            "message": f"Created {events_created} {'recurring' if is_recurring else 'one-time'} events",
+            "message": (f"Created {counts['insert']}, updated {counts['update']} and removed {counts['delete']} "
+                        f"{kind} events; {len(unchanged)} already up to date"),
             "available_days": available_days
         }
         
@@ -580,8 +814,7 @@ def complete_auth_headless(auth_code, credentials_dir=None):
             creds = flow.credentials
             
             # Save the credentials
-            with open(token_path, 'w') as token:
-                token.write(creds.to_json())
+            save_credentials(creds, token_path)
             
             return {
                 "success": True,
@@ -617,36 +850,26 @@ def get_current_user_info(credentials_dir=None):
     
     try:
         print(f"Loading credentials from: {token_path}")
-        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-        print(f"Credentials loaded. Valid: {creds.valid}, Expired: {creds.expired if hasattr(creds, 'expired') else 'N/A'}")
+        session = get_session(credentials_dir, SCOPES)
+        if session is None:
+            return {
+                "success": False,
+                "authenticated": False,
+                "message": "No user currently logged in"
+            }
+        print(f"Credentials loaded. Valid: {session.creds.valid}, Expiring: {session.expiring()}")
         
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                try:
-                    print("Attempting to refresh expired credentials")
-                    creds.refresh(Request())
-                    # Save refreshed credentials
-                    with open(token_path, 'w') as token:
-                        token.write(creds.to_json())
-                    print("Successfully refreshed credentials")
-                except Exception as e:
-                    print(f"Failed to refresh credentials: {str(e)}")
-                    return {
-                        "success": False,
-                        "authenticated": False,
-                        "message": "Credentials expired and refresh failed"
-                    }
-            else:
-                print("Invalid credentials and cannot refresh")
-                return {
-                    "success": False,
-                    "authenticated": False,
-                    "message": "Invalid credentials"
-                }
+        if not session.refresh_if_expiring():
+            print("Failed to refresh credentials")
+            return {
+                "success": False,
+                "authenticated": False,
+                "message": "Credentials expired and refresh failed"
+            }
         
         # Get user info from the calendar service
         print("Building calendar service")
-        service = build('calendar', 'v3', credentials=creds)
+        service = session.calendar()
         print("Getting calendar list")
         calendar_list = service.calendarList().get(calendarId='primary').execute()
         print(f"Got calendar info for: {calendar_list.get('id', 'Unknown')}")
@@ -673,6 +896,8 @@ def logout_user(credentials_dir=None):
     token_path = os.path.join(credentials_dir, 'token.json')
     
     try:
+        # The sync index describes this user's calendar
+        remove_index(credentials_dir)
         if os.path.exists(token_path):
             os.remove(token_path)
             return {
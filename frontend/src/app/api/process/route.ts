@@ -19,6 +19,258 @@ function getPythonCommand() {
   return 'python3';  // Use python3 on Unix-like systems
 }
 
+// Base URL of the persistent OCR worker (ocr_server.py), if one is running
+const workerUrl = process.env.AUTOTT_WORKER_URL;
+
+class WorkerBusyError extends Error {}
+
+// Ask the persistent worker to process the files; returns null if it is unreachable
+async function processWithWorker(imagePath: string, csvPath: string, signal?: AbortSignal) {
+  if (!workerUrl) {
+    return null;
+  }
+
+  let response: Response;
+  try {
+    response = await fetch(`${workerUrl.replace(/\/$/, '')}/process`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ image_path: imagePath, csv_path: csvPath }),
+      signal
+    });
+  } catch (err) {
+    if (signal?.aborted) {
+      throw err;
+    }
+    console.error('OCR worker unreachable, falling back to subprocess:', err);
+    return null;
+  }
+
+  const data = await response.json();
+  if (response.status === 503) {
+    throw new WorkerBusyError(data.error || 'OCR worker is busy');
+  }
+  if (!response.ok) {
+    throw new Error(data.error || `OCR worker failed with status ${response.status}`);
+  }
+  return data.schedule;
+}
+
+// Sync through the worker, which keeps the Calendar client and token warm between requests;
+// returns null if it is unreachable or can't sync
+async function syncWithWorker(
+  schedulePath: string,
+  selectedDays: string,
+  isRecurring: boolean,
+  credentialsDir: string,
+  startDate: string
+) {
+  if (!workerUrl) {
+    return null;
+  }
+
+  try {
+    const response = await fetch(`${workerUrl.replace(/\/$/, '')}/calendar/sync`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        schedule_path: schedulePath,
+        selected_days: selectedDays,
+        is_recurring: isRecurring,
+        credentials_dir: credentialsDir,
+        start_date: startDate
+      })
+    });
+    if (!response.ok) {
+      return null;
+    }
+    return await response.json();
+  } catch (err) {
+    console.error('Calendar sync worker unreachable, falling back to subprocess:', err);
+    return null;
+  }
+}
+
+interface PipelineFrame {
+  type: 'stage' | 'day' | 'result' | 'error';
+  [key: string]: unknown;
+}
+
+// Run main.py in a fresh interpreter. With onFrame, days are OCR'd one at a time and
+// every stage and day frame is passed on as soon as it arrives. Aborting `signal` kills it.
+function runPipelineProcess(
+  pythonCommand: string,
+  projectRoot: string,
+  imagePath: string,
+  csvPath: string,
+  onFrame?: (frame: PipelineFrame) => void,
+  signal?: AbortSignal
+): Promise<Record<string, unknown[]>> {
+  const pythonProcess = spawn(pythonCommand, [
+    join(projectRoot, 'main.py'),
+    imagePath,
+    csvPath,
+    '--protocol',
+    'ndjson',
+    '--quiet',
+    ...(onFrame ? ['--stream'] : [])
+  ], {
+    env: {
+      ...process.env,
+      PYTHONIOENCODING: 'utf-8',
+      PYTHONUTF8: '1'
+    }
+  });
+
+  return new Promise((resolve, reject) => {
+    if (signal) {
+      const abort = () => {
+        pythonProcess.kill();
+        reject(new Error('Request was cancelled'));
+      };
+      if (signal.aborted) {
+        abort();
+      } else {
+        signal.addEventListener('abort', abort, { once: true });
+        pythonProcess.on('close', () => signal.removeEventListener('abort', abort));
+      }
+    }
+
+    // stdout carries one JSON frame per line; anything else from Python goes to stderr
+    let pending = '';
+    let errorData = '';
+    let settled = false;
+
+    const handleLine = (line: string) => {
+      if (!line.trim() || settled) {
+        return;
+      }
+      let frame;
+      try {
+        frame = JSON.parse(line);
+      } catch {
+        console.error('Ignoring non-JSON line from Python:', sanitizeOutput(line));
+        return;
+      }
+      if (frame.type === 'stage') {
+        console.log(`Python stage ${frame.stage} ${frame.status}`,
+          frame.duration_ms !== undefined ? `(${frame.duration_ms} ms)` : '');
+      }
+      if (onFrame && (frame.type === 'stage' || frame.type === 'day')) {
+        onFrame(frame);
+      }
+      if (frame.type === 'result') {
+        settled = true;
+        if (!frame.schedule || typeof frame.schedule !== 'object') {
+          reject(new Error('Invalid JSON data structure'));
+          return;
+        }
+        resolve(frame.schedule);
+      } else if (frame.type === 'error') {
+        settled = true;
+        reject(new Error(frame.error));
+      }
+    };
+
+    pythonProcess.stdout.on('data', (data) => {
+      pending += data.toString();
+      const lines = pending.split('\n');
+      pending = lines.pop() ?? '';
+      lines.forEach(handleLine);
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+      const sanitizedData = sanitizeOutput(data.toString());
+      console.error('Python stderr:', sanitizedData);
+      errorData += sanitizedData;
+    });
+
+    pythonProcess.on('close', (code) => {
+      console.log('Python process exited with code:', code);
+      handleLine(pending);
+      if (settled) {
+        return;
+      }
+      if (code !== 0) {
+        reject(new Error(`Python process failed (code ${code}): ${errorData}`));
+        return;
+      }
+      reject(new Error('No result frame in Python output'));
+    });
+
+    pythonProcess.on('error', (err) => {
+      console.error('Process error:', err);
+      reject(new Error(`Failed to start process: ${err.message}`));
+    });
+  });
+}
+
+// Stream stage and day events to the browser as Server-Sent Events, ending with a
+// result or error event. cleanup runs once the stream is finished.
+function streamSchedule(
+  pythonCommand: string,
+  projectRoot: string,
+  imagePath: string,
+  csvPath: string,
+  cleanup: () => Promise<void>
+) {
+  const encoder = new TextEncoder();
+  // Aborted when the client goes away, which kills the Python process
+  const abortController = new AbortController();
+  let cleanedUp: Promise<void> | null = null;
+  const cleanupOnce = () => {
+    cleanedUp = cleanedUp ?? cleanup();
+    return cleanedUp;
+  };
+
+  const stream = new ReadableStream({
+    async start(controller) {
+      const send = (event: string, data: unknown) => {
+        if (abortController.signal.aborted) {
+          return;
+        }
+        controller.enqueue(encoder.encode(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`));
+      };
+
+      try {
+        let scheduleData = await processWithWorker(imagePath, csvPath, abortController.signal);
+        if (scheduleData === null) {
+          scheduleData = await runPipelineProcess(pythonCommand, projectRoot, imagePath, csvPath,
+            (frame) => send(frame.type, frame), abortController.signal);
+        } else {
+          // The worker answers in one piece; still send the days so clients handle one format
+          for (const [day, periods] of Object.entries(scheduleData)) {
+            send('day', { type: 'day', day, periods });
+          }
+        }
+        send('result', { type: 'result', schedule: scheduleData });
+      } catch (err) {
+        if (!abortController.signal.aborted) {
+          console.error('Processing error:', err);
+          send('error', { type: 'error', error: err instanceof Error ? err.message : 'Failed to process request' });
+        }
+      } finally {
+        if (!abortController.signal.aborted) {
+          controller.close();
+        }
+        await cleanupOnce();
+      }
+    },
+    async cancel() {
+      abortController.abort();
+      await cleanupOnce();
+    }
+  });
+
+  return new Response(stream, {
+    headers: {
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache, no-transform',
+      Connection: 'keep-alive'
+    }
+  });
+}
+
 // Helper function to sanitize process output
 function sanitizeOutput(output: string): string {
   return output.replace(/[\u0000-\u0008\u000B-\u000C\u000E-\u001F\u007F-\u009F]/g, '');
@@ -26,6 +278,8 @@ function sanitizeOutput(output: string): string {
 
 export async function POST(req: Request) {
   let tempDir = '';
+  // Set when a streamed response takes over removing the temp directory
+  let cleanupDeferred = false;
   const pythonCommand = getPythonCommand();
   
   try {
@@ -36,6 +290,8 @@ export async function POST(req: Request) {
     const selectedDays = formData.get('selected_days') as string;
     const isRecurring = formData.get('is_recurring') === 'true';
     const startDate = formData.get('start_date') as string;
+    // Calendar sync needs the whole schedule, so only plain processing is streamed
+    const streamProgress = formData.get('stream') === 'true' && !syncToCalendar;
 
     if (!image || !csvFile) {
       return NextResponse.json(
@@ -75,71 +331,24 @@ export async function POST(req: Request) {
       throw new Error('Failed to save uploaded files');
     }
 
-    // Process timetable first
-    const pythonProcess = spawn(pythonCommand, [
-      join(projectRoot, 'main.py'),
-      imagePath,
-      csvPath,
-      '--return-schedules'
-    ], {
-      env: {
-        ...process.env,
-        PYTHONIOENCODING: 'utf-8',
-        PYTHONUTF8: '1'
-      }
-    });
-
-    const scheduleData = await new Promise((resolve, reject) => {
-      let outputData = '';
-      let errorData = '';
-
-      pythonProcess.stdout.on('data', (data) => {
-        const sanitizedData = sanitizeOutput(data.toString());
-        console.log('Python stdout:', sanitizedData);
-        outputData += sanitizedData;
-      });
-
-      pythonProcess.stderr.on('data', (data) => {
-        const sanitizedData = sanitizeOutput(data.toString());
-        console.error('Python stderr:', sanitizedData);
-        errorData += sanitizedData;
-      });
-
-      pythonProcess.on('close', (code) => {
-        console.log('Python process exited with code:', code);
-        if (code !== 0) {
-          reject(new Error(`Python process failed (code ${code}): ${errorData}`));
-          return;
-        }
-
+    if (streamProgress) {
+      cleanupDeferred = true;
+      const dir = tempDir;
+      return streamSchedule(pythonCommand, projectRoot, imagePath, csvPath, async () => {
         try {
-          // Look for JSON data in the output
-          const jsonMatch = outputData.match(/\{[\s\S]*\}/);
-          if (!jsonMatch) {
-            console.error('Full output:', outputData);
-            reject(new Error('No JSON data found in output'));
-            return;
-          }
-
-          // Parse and validate the JSON data
-          const jsonData = JSON.parse(jsonMatch[0]);
-          if (!jsonData || typeof jsonData !== 'object') {
-            throw new Error('Invalid JSON data structure');
-          }
-
-          resolve(jsonData);
+          await rm(dir, { recursive: true, force: true });
         } catch (err) {
-          console.error('Parse error:', err);
-          console.error('Full output:', outputData);
-          reject(new Error(`Failed to parse output: ${err instanceof Error ? err.message : 'Unknown error'}`));
+          console.error('Failed to cleanup:', err);
         }
       });
+    }
 
-      pythonProcess.on('error', (err) => {
-        console.error('Process error:', err);
-        reject(new Error(`Failed to start process: ${err.message}`));
-      });
-    });
+    // Process timetable first, preferring the warm worker over a fresh interpreter
+    let scheduleData = await processWithWorker(imagePath, csvPath);
+
+    if (scheduleData === null) {
+      scheduleData = await runPipelineProcess(pythonCommand, projectRoot, imagePath, csvPath);
+    }
 
     if (!syncToCalendar) {
       return NextResponse.json({ schedule: scheduleData });
@@ -148,7 +357,13 @@ export async function POST(req: Request) {
     // Save schedule data to file for calendar sync
     await writeFile(schedulePath, JSON.stringify(scheduleData));
 
-    // Calendar sync path
+    // Calendar sync path; the subprocess also takes over when the user still has to log in
+    const workerResult = await syncWithWorker(schedulePath, selectedDays || '', isRecurring,
+      projectRoot, startDate || '');
+    if (workerResult !== null && !workerResult.needs_auth) {
+      return NextResponse.json(workerResult);
+    }
+
     const calendarProcess = spawn(pythonCommand, [
       join(projectRoot, 'calendar_sync.py'),
       schedulePath,
@@ -257,13 +472,16 @@ export async function POST(req: Request) {
     return NextResponse.json(result);
   } catch (error) {
     console.error('Processing error:', error);
+    if (error instanceof WorkerBusyError) {
+      return NextResponse.json({ error: error.message }, { status: 503 });
+    }
     return NextResponse.json(
       { error: error instanceof Error ? error.message : 'Failed to process request' },
       { status: 500 }
     );
   } finally {
     // Cleanup
-    if (tempDir) {
+    if (tempDir && !cleanupDeferred) {
       try {
         await rm(tempDir, { recursive: true, force: true });
       } catch (err) {
@@ -122,13 +122,15 @@ export default function Home() {
       const formData = new FormData();
       formData.append('image', imageFile);
       formData.append('csv_file', csvFile);
+      // Ask for Server-Sent Events so each day shows up as soon as it is read
+      formData.append('stream', 'true');
 
       const response = await fetch('/api/process', {
         method: 'POST',
         body: formData,
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         let errorMessage = 'Failed to process timetable';
         try {
           const errorData = await response.json();
@@ -139,12 +141,43 @@ export default function Home() {
         throw new Error(errorMessage);
       }
 
-      const data = await response.json();
-      if (!data.schedule) {
+      setSchedule(null);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finalSchedule: DaySchedule | null = null;
+
+      while (finalSchedule === null) {
+        const { done, value } = await reader.read();
+        if (done) {
+          break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        // Events are separated by a blank line; keep any partial event for the next chunk
+        const events = buffer.split('\n\n');
+        buffer = events.pop() ?? '';
+
+        for (const event of events) {
+          const dataLine = event.split('\n').find((line) => line.startsWith('data: '));
+          if (!dataLine) {
+            continue;
+          }
+          const frame = JSON.parse(dataLine.slice('data: '.length));
+          if (frame.type === 'day') {
+            setSchedule((previous) => ({ ...(previous || {}), [frame.day]: frame.periods }));
+          } else if (frame.type === 'result') {
+            finalSchedule = frame.schedule;
+          } else if (frame.type === 'error') {
+            throw new Error(frame.error);
+          }
+        }
+      }
+
+      if (!finalSchedule) {
         throw new Error('No schedule data received');
       }
       
-      setSchedule(data.schedule);
+      setSchedule(finalSchedule);
       setError(null);
     } catch (err) {
       console.error('Processing error:', err);
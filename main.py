@@ -1,7 +1,5 @@
 import cv2
 import numpy as np
-import pytesseract
-from PIL import Image
 import re
 import csv
 import argparse
@@ -9,6 +7,18 @@ import os
 import sys
 import json
 import locale
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from functools import lru_cache, partial
+from result_cache import ResultCache
+from ocr_cache import CellOCRCache
+from ocr_backend import BACKEND_NAMES, get_backend
+from batch import discover_jobs, run_batch
+from schedule_model import (DaySchedule, Period, dumps_schedule, format_minutes, json_default,
+                            merge_lab_periods, schedule_from_dict, schedule_to_dict)
+from slot_lexicon import SlotLexicon
+from tracing import CountingBackend, Trace
 
 # Set UTF-8 encoding for stdout
 if sys.stdout.encoding != 'utf-8':
@@ -26,6 +36,31 @@ def safe_print(*args, **kwargs):
             # Last resort: skip problematic characters
             print(*[str(arg).encode('ascii', 'ignore').decode() for arg in args], **kwargs)
 
+# Diagnostic output is on by default for interactive use; production callers turn it off
+VERBOSE = True
+LOG_STREAM = None  # None means stdout
+
+def set_verbose(enabled):
+    global VERBOSE
+    VERBOSE = enabled
+
+def set_log_stream(stream):
+    # Machine protocols keep stdout for frames and move diagnostics elsewhere
+    global LOG_STREAM
+    LOG_STREAM = stream
+
+def log(*args, **kwargs):
+    if VERBOSE:
+        safe_print(*args, file=LOG_STREAM or sys.stdout, **kwargs)
+
+_frame_lock = threading.Lock()
+
+def emit_frame(frame):
+    # One JSON object per line, flushed at once so the reader can act on it immediately
+    with _frame_lock:
+        sys.stdout.write(json.dumps(frame, default=json_default) + '\n')
+        sys.stdout.flush()
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process timetable image and course codes.')
     parser.add_argument('--image', '-i', 
@@ -36,33 +71,44 @@ def parse_arguments():
                       help='Path to the CSV file containing course codes')
     return parser.parse_args()
 
+# Bump whenever a change can alter the schedule produced for the same inputs,
+# so cached results from older versions are not reused
+PIPELINE_VERSION = 4
+
+# OCR options that only affect speed or side outputs, not the schedule itself
+CACHE_NEUTRAL_OPTIONS = {'workers', 'details', 'cell_cache'}
+
+# Full period code, e.g. L5-BCSE301P-LO-AB1-205B-ALL
+PERIOD_PATTERN = re.compile(r'[A-Z]+\d+-[A-Z]{4}\d{3}[A-Z]?-[A-Z]{2,3}-AB\d-\d{3}(?:-[A-Z]+)?')
+
+# Whitespace and stray characters OCR leaves around period codes, dropped in one pass
+PERIOD_JUNK = re.compile(r"[\s/|‘’`()]+")
+
 def normalize_period(period):
     if not period:
         return ""
-    period = period.replace('\n', '')
-    period = period.replace('/', '')
-    period = period.replace('|', '')
-    period = period.replace('‘', '')
-    period = period.replace('’', '')
-    period = period.replace('`', '')
-    period = period.replace('(', '')
-    period = period.replace(')', '')
-    period = period.strip()
-    period = re.sub(r'\s+', '', period)
-    return period
-
-def preprocess_image(image_path):
-    print("Preprocessing image...")
+    return PERIOD_JUNK.sub('', period)
+
+def preprocess_image(image_path, detect_width=None):
+    log("Preprocessing image...")
     image = cv2.imread(image_path)
     if image is None:
         raise FileNotFoundError(f"Could not load image at {image_path}")
         
     # Get image dimensions
     height, width = image.shape[:2]
-    print(f"Original image dimensions: {width}x{height}")
+    log(f"Original image dimensions: {width}x{height}")
+    
+    # Wide screenshots can be searched for cells on a smaller copy; OCR still reads
+    # full-resolution ROIs, so the full-size grayscale buffer is skipped too
+    detect_image = image
+    if detect_width and width > detect_width:
+        detect_height = max(1, round(height * detect_width / width))
+        detect_image = cv2.resize(image, (detect_width, detect_height), interpolation=cv2.INTER_AREA)
+        log(f"Detecting cells on a {detect_width}x{detect_height} copy")
     
     # Convert to HSV for better color detection
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    hsv = cv2.cvtColor(detect_image, cv2.COLOR_BGR2HSV)
     
     # Define yellow and green color ranges in HSV
     yellow_lower = np.array([20, 50, 180])
@@ -74,26 +120,53 @@ def preprocess_image(image_path):
     yellow_mask = cv2.inRange(hsv, yellow_lower, yellow_upper)
     green_mask = cv2.inRange(hsv, green_lower, green_upper)
     
-    # Combine masks
+    # Combine masks, and let the full-size HSV copy go before the grayscale ones are made
     highlight_mask = cv2.bitwise_or(yellow_mask, green_mask)
+    del hsv, yellow_mask, green_mask
     
     # Convert original image to grayscale for OCR
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(detect_image, cv2.COLOR_BGR2GRAY)
     
     # Create binary image for structure detection
     _, binary = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
     
-    print("Image preprocessing complete.")
+    if detect_image is not image:
+        # The downscaled grayscale is no use for OCR; cells are converted one ROI at a time
+        gray = None
+    
+    log("Image preprocessing complete.")
     return image, gray, highlight_mask, binary
 
-def get_cell_regions(mask, binary):
-    print("Detecting cell regions...")
+def scale_cells(cells, image, mask):
+    """Map cell boxes found on a downscaled mask back onto the full-resolution image"""
+    height, width = image.shape[:2]
+    scale_x = width / mask.shape[1]
+    scale_y = height / mask.shape[0]
+    if scale_x == 1 and scale_y == 1:
+        return cells
+    
+    # Scale the highlight itself, then pad it at full resolution so crops match a full-size detection
+    scaled = []
+    for cell in cells:
+        cell_type, (x, y, w, h) = cell[:2]
+        left = max(0, int(round((x + CELL_PADDING) * scale_x)) - CELL_PADDING)
+        top = max(0, int(round((y + CELL_PADDING) * scale_y)) - CELL_PADDING)
+        right = min(width, int(round((x + w - CELL_PADDING) * scale_x)) + CELL_PADDING)
+        bottom = min(height, int(round((y + h - CELL_PADDING) * scale_y)) + CELL_PADDING)
+        scaled.append((cell_type, (left, top, right - left, bottom - top)) + tuple(cell[2:]))
+    return scaled
+
+# Pixels added around each detected highlight, at whatever resolution detection ran
+CELL_PADDING = 2
+
+def get_cell_regions(mask, binary, debug_dir=None):
+    log("Detecting cell regions...")
     
     # Get image dimensions
     height, width = mask.shape[:2]
     
-    # Create a copy of the original image for visualization
-    debug_image = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
+    # Create a copy of the original image for visualization, only when debug artifacts are wanted
+    debug_image = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) if debug_dir else None
     
     # Find contours in the highlight mask (yellow/green cells)
     contours, _ = cv2.findContours(
@@ -105,20 +178,21 @@ def get_cell_regions(mask, binary):
     min_area = (width * height) * 0.0005
     max_area = (width * height) * 0.02
     
-    print(f"\nArea thresholds: min={min_area:.2f}, max={max_area:.2f}")
+    log(f"\nArea thresholds: min={min_area:.2f}, max={max_area:.2f}")
     
     for contour in contours:
         area = cv2.contourArea(contour)
         if min_area < area < max_area:
             x, y, w, h = cv2.boundingRect(contour)
-            padding = 2
+            padding = CELL_PADDING
             x = max(0, x - padding)
             y = max(0, y - padding)
             w = min(width - x, w + 2*padding)
             h = min(height - y, h + 2*padding)
             all_cells.append((x, y, w, h))
             # Draw rectangle on debug image
-            cv2.rectangle(debug_image, (x, y), (x+w, y+h), (0, 255, 0), 2)
+            if debug_image is not None:
+                cv2.rectangle(debug_image, (x, y), (x+w, y+h), (0, 255, 0), 2)
     
     # Sort cells by y-coordinate first to group rows
     all_cells.sort(key=lambda cell: cell[1])
@@ -126,11 +200,12 @@ def get_cell_regions(mask, binary):
     # Find the start of content (after blue header)
     if len(all_cells) > 0:
         content_start_y = all_cells[0][1]  # Y coordinate of first highlighted cell
-        print(f"Content starts at y={content_start_y}")
+        log(f"Content starts at y={content_start_y}")
         # Draw content start line
-        cv2.line(debug_image, (0, content_start_y), (width, content_start_y), (255, 0, 0), 2)
+        if debug_image is not None:
+            cv2.line(debug_image, (0, content_start_y), (width, content_start_y), (255, 0, 0), 2)
     else:
-        print("No cells detected!")
+        log("No cells detected!")
         return [], []
     
     # Group cells into day rows (each day has theory and lab row)
@@ -139,7 +214,7 @@ def get_cell_regions(mask, binary):
     current_lab_row = []
     last_y = None
     y_threshold = height * 0.03  # 3% of image height for row grouping
-    print(f"Y-coordinate threshold for row grouping: {y_threshold:.2f}")
+    log(f"Y-coordinate threshold for row grouping: {y_threshold:.2f}")
     
     for cell in all_cells:
         x, y, w, h = cell
@@ -149,24 +224,24 @@ def get_cell_regions(mask, binary):
             
         if last_y is None:
             current_theory_row.append(cell)
-            print(f"\nStarting new theory row at y={y}")
+            log(f"\nStarting new theory row at y={y}")
         else:
             y_diff = abs(y - last_y)
-            print(f"Y difference: {y_diff:.2f} (threshold: {y_threshold:.2f})")
+            log(f"Y difference: {y_diff:.2f} (threshold: {y_threshold:.2f})")
             if y_diff < y_threshold:
                 # Same row
                 if len(current_lab_row) > 0:
                     current_lab_row.append(cell)
-                    print(f"Adding to lab row: ({x}, {y})")
+                    log(f"Adding to lab row: ({x}, {y})")
                 else:
                     current_theory_row.append(cell)
-                    print(f"Adding to theory row: ({x}, {y})")
+                    log(f"Adding to theory row: ({x}, {y})")
             else:
                 # New row
                 if len(current_theory_row) > 0 and len(current_lab_row) == 0:
                     # Moving to lab row
                     current_lab_row.append(cell)
-                    print(f"\nStarting new lab row at y={y}")
+                    log(f"\nStarting new lab row at y={y}")
                 else:
                     # Complete day, store and reset
                     if current_theory_row and current_lab_row:
@@ -174,13 +249,13 @@ def get_cell_regions(mask, binary):
                         current_theory_row.sort(key=lambda c: c[0])
                         current_lab_row.sort(key=lambda c: c[0])
                         day_rows.append((current_theory_row[:12], current_lab_row[:12]))
-                        print(f"\nCompleted day {len(day_rows)}:")
-                        print(f"Theory cells: {len(current_theory_row[:12])}")
-                        print(f"Lab cells: {len(current_lab_row[:12])}")
+                        log(f"\nCompleted day {len(day_rows)}:")
+                        log(f"Theory cells: {len(current_theory_row[:12])}")
+                        log(f"Lab cells: {len(current_lab_row[:12])}")
                     # Start new theory row
                     current_theory_row = [cell]
                     current_lab_row = []
-                    print(f"\nStarting new theory row at y={y}")
+                    log(f"\nStarting new theory row at y={y}")
         last_y = y
     
     # Add the last day if complete
@@ -188,157 +263,534 @@ def get_cell_regions(mask, binary):
         current_theory_row.sort(key=lambda c: c[0])
         current_lab_row.sort(key=lambda c: c[0])
         day_rows.append((current_theory_row[:12], current_lab_row[:12]))
-        print(f"\nCompleted final day {len(day_rows)}:")
-        print(f"Theory cells: {len(current_theory_row[:12])}")
-        print(f"Lab cells: {len(current_lab_row[:12])}")
+        log(f"\nCompleted final day {len(day_rows)}:")
+        log(f"Theory cells: {len(current_theory_row[:12])}")
+        log(f"Lab cells: {len(current_lab_row[:12])}")
     
     # Save debug image
-    cv2.imwrite('detected_regions.png', debug_image)
-    print("\nSaved visualization to 'detected_regions.png'")
+    if debug_image is not None:
+        # Each caller picks its own directory, so concurrent requests never share a file
+        os.makedirs(debug_dir, exist_ok=True)
+        debug_path = os.path.join(debug_dir, 'detected_regions.png')
+        cv2.imwrite(debug_path, debug_image)
+        log(f"\nSaved visualization to '{debug_path}'")
     
     # Flatten the cells while preserving theory/lab information
     processed_cells = []
     for day_index, (theory_row, lab_row) in enumerate(day_rows, 1):
-        print(f"\nDay {day_index}:")
+        log(f"\nDay {day_index}:")
         # Add theory cells
-        print("Theory cells x-coordinates:", [x for x, _, _, _ in theory_row])
+        log("Theory cells x-coordinates:", [x for x, _, _, _ in theory_row])
         for cell in theory_row:
             processed_cells.append(('theory', cell))
         # Add lab cells
-        print("Lab cells x-coordinates:", [x for x, _, _, _ in lab_row])
+        log("Lab cells x-coordinates:", [x for x, _, _, _ in lab_row])
         for cell in lab_row:
             processed_cells.append(('lab', cell))
     
-    print(f"\nFound {len(processed_cells)} cells in {len(day_rows)} days")
+    log(f"\nFound {len(processed_cells)} cells in {len(day_rows)} days")
     return processed_cells, []  # Empty timing cells as we're using hardcoded timings
 
-def extract_text_from_cells(image, cells, timing_cells=None):
-    print("Starting text extraction from cells...")
-    matrix = []
-    timings = {'theory': [], 'lab': []}
+DETECTORS = ['contours', 'grid']
+# A profile position counts as highlighted above this fraction of the strongest one
+GRID_PROFILE_THRESHOLD = 0.3
+# Bands much thinner than the typical row or column are text or border noise
+GRID_MIN_BAND_RATIO = 0.4
+# A grid cell is emitted when at least this much of it is highlighted
+GRID_CELL_FILL = 0.5
+# The header band is solid across at least this fraction of the width in the binary image
+GRID_HEADER_FILL = 0.6
+
+def profile_bands(profile, threshold):
+    """Return (start, end) runs where a projection profile is above threshold, end exclusive"""
+    above = np.concatenate(([False], profile > threshold, [False]))
+    edges = np.flatnonzero(np.diff(above.astype(np.int8)))
+    bands = list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+    if not bands:
+        return []
+    typical = np.median([end - start for start, end in bands])
+    return [(start, end) for start, end in bands if end - start >= typical * GRID_MIN_BAND_RATIO]
+
+def header_bottom(binary, before, min_height):
+    """Bottom edge of the last solid band at least min_height tall above y=before, or None"""
+    fill = np.count_nonzero(binary[:before], axis=1)
+    bands = [(top, bottom) for top, bottom in profile_bands(fill, binary.shape[1] * GRID_HEADER_FILL)
+             if bottom - top >= min_height]
+    return bands[-1][1] if bands else None
+
+def skipped_rows(gap, border, shortest, tallest):
+    """How many rows without highlights sit in a gap between two highlighted bands"""
+    if gap - border < shortest / 2:
+        return 0
+    return int(np.ceil((gap - border) / (tallest + border)))
+
+def get_grid_cells(mask, binary, debug_dir=None):
+    """
+    Infer the timetable grid from row and column projections of the highlight mask.
+    Cells come back as (type, box, (day_index, slot_index)), so a missing cell never
+    shifts the ones after it. Rows are numbered in order below the header band, theory
+    and lab alternating, and only a gap tall enough to hold a row counts as skipped rows;
+    rows with wrapped codes are twice as tall as the others, so their spacing can't be
+    used. Falls back to get_cell_regions when no grid is found.
+    """
+    log("Detecting cell grid from projection profiles...")
+    height, width = mask.shape[:2]
+    highlighted = mask > 0
     
-    # Then extract course data
-    for (cell_type, (x, y, w, h)) in cells:
-        # Extract the cell image with strict padding
-        padding = 2  # Reduced padding to stay within borders
-        x_start = max(0, x - padding)
-        y_start = max(0, y - padding)
-        x_end = min(image.shape[1], x + w + padding)
-        y_end = min(image.shape[0], y + h + padding)
-        cell_img = image[y_start:y_end, x_start:x_end]
-        
-        # Convert to PIL Image
-        pil_img = Image.fromarray(cv2.cvtColor(cell_img, cv2.COLOR_BGR2RGB))
-        
-        # Scale up for better OCR
-        scale_factor = 3.0  # Increased scale factor for better recognition
-        new_size = (int(cell_img.shape[1] * scale_factor), int(cell_img.shape[0] * scale_factor))
-        pil_img = pil_img.resize(new_size, Image.Resampling.LANCZOS)
-        
-        # Try different PSM modes with specific configurations
-        psm_modes = [
-            (7, '--psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-'),  # Single line with limited chars
-            (6, '--psm 6'),  # Uniform block of text
-            (3, '--psm 3')   # Fully automatic
-        ]
-        best_text = ""
-        max_confidence = 0
-        
-        for psm, config in psm_modes:
-            # Extract text with confidence info
-            data = pytesseract.image_to_data(
-                pil_img,
-                config=config,
-                output_type=pytesseract.Output.DICT
-            )
-            
-            # Combine all text with confidence above threshold
-            text_parts = []
-            avg_confidence = 0
-            valid_parts = 0
-            
-            for i in range(len(data['text'])):
-                if int(data['conf'][i]) > 25:  # Lower confidence threshold for short texts
-                    text = data['text'][i].strip()
-                    if text:
-                        text_parts.append(text)
-                        avg_confidence += int(data['conf'][i])
-                        valid_parts += 1
-            
-            if valid_parts > 0:
-                avg_confidence /= valid_parts
-                text = ' '.join(text_parts)
-                
-                # Special handling for short codes
-                if re.match(r'^[A-Z]\d+$|^[A-Z]{2}\d+$', text):  # Matches A1, B2, TG1, etc.
-                    avg_confidence += 10  # Boost confidence for valid short codes
-                
-                if avg_confidence > max_confidence:
-                    max_confidence = avg_confidence
-                    best_text = text
-        
-        # Clean up the extracted text
-        best_text = best_text.strip()
-        best_text = re.sub(r'\s+', ' ', best_text)  # Normalize spaces
+    row_profile = np.count_nonzero(highlighted, axis=1)
+    if not row_profile.any():
+        log("No cells detected!")
+        return [], []
+    rows = profile_bands(row_profile, row_profile.max() * GRID_PROFILE_THRESHOLD)
+    
+    # Columns are measured over the highlighted rows only, so headers and labels don't blur them
+    in_rows = np.zeros(height, dtype=bool)
+    for top, bottom in rows:
+        in_rows[top:bottom] = True
+    column_profile = np.count_nonzero(highlighted[in_rows], axis=0)
+    columns = profile_bands(column_profile, column_profile.max() * GRID_PROFILE_THRESHOLD)
+    
+    slots_per_row = len(THEORY_SLOTS)
+    if len(columns) != slots_per_row or len(rows) < 2:
+        log(f"Grid inference found {len(rows)} rows and {len(columns)} columns, "
+            "falling back to contour detection")
+        return get_cell_regions(mask, binary, debug_dir)
+    
+    # Neighbouring rows are only a border apart; anything wider held rows without highlights
+    row_heights = [bottom - top for top, bottom in rows]
+    shortest, tallest = min(row_heights), max(row_heights)
+    border = min(next_top - bottom for (_, bottom), (next_top, _) in zip(rows, rows[1:]))
+    content_top = header_bottom(binary, rows[0][0], shortest)
+    if content_top is None:
+        log("No header band found, counting rows from the first highlighted one")
+        content_top = rows[0][0] - border
+    row_positions = [skipped_rows(rows[0][0] - content_top, border, shortest, tallest)]
+    for (_, bottom), (next_top, _) in zip(rows, rows[1:]):
+        skipped = skipped_rows(next_top - bottom, border, shortest, tallest)
+        row_positions.append(row_positions[-1] + 1 + skipped)
+    if row_positions[-1] + 1 > len(rows):
+        log(f"Grid has {row_positions[-1] + 1 - len(rows)} rows without highlights")
+    
+    debug_image = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) if debug_dir else None
+    padding = CELL_PADDING
+    cells = []
+    for (top, bottom), position in zip(rows, row_positions):
+        # Every day is a theory row followed by a lab row
+        day_index, row_type = position // 2, ('theory', 'lab')[position % 2]
+        if day_index >= len(DAYS):
+            log(f"Skipping a {row_type} row outside the week at y={top}")
+            continue
+        for slot_index, (left, right) in enumerate(columns):
+            fill = np.count_nonzero(highlighted[top:bottom, left:right]) / ((bottom - top) * (right - left))
+            if fill < GRID_CELL_FILL:
+                continue
+            x, y = max(0, left - padding), max(0, top - padding)
+            w = min(width - x, right - left + 2 * padding)
+            h = min(height - y, bottom - top + 2 * padding)
+            cells.append((row_type, (x, y, w, h), (day_index, slot_index)))
+            if debug_image is not None:
+                cv2.rectangle(debug_image, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    
+    if debug_image is not None:
+        os.makedirs(debug_dir, exist_ok=True)
+        debug_path = os.path.join(debug_dir, 'detected_regions.png')
+        cv2.imwrite(debug_path, debug_image)
+        log(f"\nSaved visualization to '{debug_path}'")
+    
+    log(f"\nFound {len(cells)} cells in a {len(columns)}-column grid of {row_positions[-1] + 1} rows")
+    return cells, []
+
+OCR_WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-'
+
+# Tesseract page segmentation modes tried for every cell, in order, with their whitelists
+PSM_MODES = [
+    (7, OCR_WHITELIST),  # Single line with limited chars
+    (6, None),  # Uniform block of text
+    (3, None)   # Fully automatic
+]
+
+# A stacked montage holds many lines, so the single-line pass runs as a block
+# with the same whitelist when cells are OCR'd together: (reported mode, mode run, whitelist)
+BATCH_PSM_MODES = [
+    (7, 6, OCR_WHITELIST),
+    (6, 6, None),
+    (3, 3, None)
+]
+
+OCR_SCALE_FACTOR = 3.0  # Increased scale factor for better recognition
+MONTAGE_GAP = 40  # White rows between stacked cells so tesseract keeps them apart
+MONTAGE_MAX_HEIGHT = 12000  # Keep each montage well below tesseract's image size limits
+
+# Blank-cell pre-filter: a pixel counts as ink when it is this much darker than the
+# cell's background, and a cell needs at least this share of ink pixels to be OCR'd
+BLANK_INK_CONTRAST = 60
+BLANK_INK_RATIO = 0.004
+
+def crop_cell(image, x, y, w, h):
+    # Extract the cell image with strict padding
+    padding = 2  # Reduced padding to stay within borders
+    x_start = max(0, x - padding)
+    y_start = max(0, y - padding)
+    x_end = min(image.shape[1], x + w + padding)
+    y_end = min(image.shape[0], y + h + padding)
+    return image[y_start:y_end, x_start:x_end]
+
+def is_blank_cell(gray_cell):
+    # Ignore the outer margin, where cell borders and neighbouring lines show up
+    height, width = gray_cell.shape[:2]
+    margin_y = max(3, int(height * 0.08))
+    margin_x = max(3, int(width * 0.08))
+    inner = gray_cell[margin_y:height - margin_y, margin_x:width - margin_x]
+    if inner.size == 0:
+        return True
+    
+    # Text is dark on a light highlight, so measure pixels well below the background level
+    background = np.median(inner)
+    ink_pixels = np.count_nonzero(inner < background - BLANK_INK_CONTRAST)
+    return ink_pixels / inner.size < BLANK_INK_RATIO
+
+def gray_cell(image, x, y, w, h):
+    # A view into the grayscale buffer, or a small conversion of just this ROI for colour input
+    cell_img = crop_cell(image, x, y, w, h)
+    if cell_img.ndim == 3:
+        cell_img = cv2.cvtColor(cell_img, cv2.COLOR_BGR2GRAY)
+    return cell_img
+
+def prepare_cell_image(image, x, y, w, h):
+    return upscale_cell(gray_cell(image, x, y, w, h))
+
+def upscale_cell(cell_img):
+    # Scale up for better OCR; the only per-cell allocation is the upscaled grayscale crop
+    new_size = (int(cell_img.shape[1] * OCR_SCALE_FACTOR), int(cell_img.shape[0] * OCR_SCALE_FACTOR))
+    return cv2.resize(cell_img, new_size, interpolation=cv2.INTER_LANCZOS4)
+
+def score_ocr_words(words):
+    # Combine all text with confidence above threshold
+    text_parts = []
+    avg_confidence = 0
+    valid_parts = 0
+    
+    for text, conf in words:
+        if int(conf) > 25:  # Lower confidence threshold for short texts
+            text = text.strip()
+            if text:
+                text_parts.append(text)
+                avg_confidence += int(conf)
+                valid_parts += 1
+    
+    if valid_parts == 0:
+        return "", 0
+    
+    avg_confidence /= valid_parts
+    text = ' '.join(text_parts)
+    
+    # Special handling for short codes
+    if re.match(r'^[A-Z]\d+$|^[A-Z]{2}\d+$', text):  # Matches A1, B2, TG1, etc.
+        avg_confidence += 10  # Boost confidence for valid short codes
+    
+    return text, avg_confidence
+
+def clean_cell_text(text):
+    # Clean up the extracted text
+    text = text.strip()
+    return re.sub(r'\s+', ' ', text)  # Normalize spaces
+
+def correct_cell_text(text, lexicon=None):
+    # Snap near-miss period codes onto the grammar and the CSV's course codes
+    if lexicon is None or not text:
+        return text
+    normalized = normalize_period(text)
+    # A reading that is already a period code for a known course is left exactly as read
+    match = PERIOD_PATTERN.search(normalized)
+    if match and lexicon.knows_course(match.group().split('-')[1]):
+        return text
+    corrected = lexicon.correct(normalized)
+    return corrected if corrected else text
+
+def is_confident_result(text, confidence, min_confidence=None):
+    # A result that already reads as a full period code can't be improved by the fallback modes
+    if text and PERIOD_PATTERN.search(normalize_period(text)):
+        return True
+    return min_confidence is not None and confidence >= min_confidence
+
+def ocr_cell(cell_img, backend, early_exit=True, min_confidence=None, lexicon=None):
+    # Upscaled here, so only the cell being read holds an enlarged copy
+    cell_img = upscale_cell(cell_img)
+    best_text = ""
+    max_confidence = 0
+    best_psm = None
+    user_words = lexicon.words_path() if lexicon is not None else None
+    
+    for psm, whitelist in PSM_MODES:
+        # Extract text with confidence info
+        data = backend.image_to_data(cell_img, psm, whitelist, user_words)
+        text, confidence = score_ocr_words(zip(data['text'], data['conf']))
+        text = correct_cell_text(text, lexicon)
+        if confidence > max_confidence:
+            max_confidence = confidence
+            best_text = text
+            best_psm = psm
         
-        # Always add the cell to matrix, even if empty
-        matrix.append((best_text, (x, y, w, h)))
-        print(f"Extracted text from cell at ({x}, {y}): '{best_text}' ({cell_type})")
+        # Stop the cascade as soon as a mode gives a usable answer
+        if early_exit and is_confident_result(best_text, max_confidence, min_confidence):
+            break
     
-    return matrix, timings
+    return clean_cell_text(best_text), max_confidence, best_psm
+
+def build_montages(cell_images):
+    # Stack cell crops vertically on a white canvas, remembering where each one starts
+    montages = []
+    group = []
+    group_height = MONTAGE_GAP
+    for index, img in enumerate(cell_images):
+        if group and group_height + img.shape[0] + MONTAGE_GAP > MONTAGE_MAX_HEIGHT:
+            montages.append(group)
+            group = []
+            group_height = MONTAGE_GAP
+        group.append(index)
+        group_height += img.shape[0] + MONTAGE_GAP
+    if group:
+        montages.append(group)
+    
+    for group in montages:
+        width = max(cell_images[i].shape[1] for i in group) + 2 * MONTAGE_GAP
+        height = MONTAGE_GAP + sum(cell_images[i].shape[0] + MONTAGE_GAP for i in group)
+        montage = np.full((height, width), 255, dtype=np.uint8)
+        spans = []
+        top = MONTAGE_GAP
+        for i in group:
+            cell_height, cell_width = cell_images[i].shape[:2]
+            montage[top:top + cell_height, MONTAGE_GAP:MONTAGE_GAP + cell_width] = cell_images[i]
+            spans.append((top, top + cell_height, i))
+            top += cell_height + MONTAGE_GAP
+        yield montage, spans
+
+def ocr_montage_words(cell_images, backend, psm, whitelist=None, user_words=None):
+    # Run one tesseract call per montage and hand every word back to the cell it came from
+    words = [[] for _ in cell_images]
+    for montage, spans in build_montages(cell_images):
+        data = backend.image_to_data(montage, psm, whitelist, user_words)
+        for i in range(len(data['text'])):
+            center = data['top'][i] + data['height'][i] / 2
+            for top, bottom, cell_index in spans:
+                if top - MONTAGE_GAP / 2 <= center < bottom + MONTAGE_GAP / 2:
+                    words[cell_index].append((data['text'][i], data['conf'][i]))
+                    break
+    return words
+
+def ocr_cells_batched(cell_images, backend, early_exit=True, min_confidence=None, lexicon=None):
+    best = [("", 0, None)] * len(cell_images)
+    pending = list(range(len(cell_images)))
+    user_words = lexicon.words_path() if lexicon is not None else None
+    for psm, run_psm, whitelist in BATCH_PSM_MODES:
+        if not pending:
+            break
+        log(f"Running batched OCR pass (psm {psm}) over {len(pending)} cells...")
+        words_per_cell = ocr_montage_words([cell_images[i] for i in pending], backend, run_psm,
+                                           whitelist, user_words)
+        for index, words in zip(pending, words_per_cell):
+            text, confidence = score_ocr_words(words)
+            text = correct_cell_text(text, lexicon)
+            if confidence > best[index][1]:
+                best[index] = (text, confidence, psm)
+        
+        # Only cells without a usable answer go into the next, slower pass
+        if early_exit:
+            pending = [i for i in pending if not is_confident_result(best[i][0], best[i][1], min_confidence)]
+    return [(clean_cell_text(text), confidence, psm) for text, confidence, psm in best]
+
+_ocr_executors = {}
+_ocr_executors_lock = threading.Lock()
+
+def get_ocr_executor(workers):
+    """
+    A cell OCR thread pool kept for the life of the process, so backends that hold a
+    handle per thread (tesserocr) load it once per worker instead of once per call
+    """
+    with _ocr_executors_lock:
+        executor = _ocr_executors.get(workers)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cell-ocr')
+            _ocr_executors[workers] = executor
+        return executor
 
-def map_periods_to_timings(matrix, timings):
-    # Hardcoded structure
-    days = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
+def extract_text_from_cells(image, cells, timing_cells=None, batch_ocr=False, workers=1,
+                            early_exit=True, min_confidence=None, details=None,
+                            gray=None, skip_blank=True, cell_cache=None, ocr_backend='auto',
+                            trace=None, lexicon=None):
+    log("Starting text extraction from cells...")
+    backend = get_backend(ocr_backend)
+    backend_name = backend.name
+    if trace is not None:
+        backend = CountingBackend(backend, trace)
+    matrix = []
+    timings = {'theory': [], 'lab': []}
+    results = [("", 0, None)] * len(cells)
+    # Where each cell's text came from: tesseract, the blank check, or the cell cache
+    sources = ['ocr'] * len(cells)
+    
+    # Work from the grayscale buffer from preprocess_image when there is one;
+    # otherwise each cell's ROI is converted once here and reused below
+    source = gray if gray is not None else image
+    gray_cells = [gray_cell(source, *cell[1]) for cell in cells]
+    
+    # Cheap ink check first so empty highlighted cells never reach tesseract
+    ocr_indices = []
+    for index in range(len(cells)):
+        if skip_blank and is_blank_cell(gray_cells[index]):
+            sources[index] = 'blank'
+            continue
+        ocr_indices.append(index)
+    if skip_blank:
+        log(f"Skipping OCR for {len(cells) - len(ocr_indices)} blank cells")
+    
+    # Pixel-identical crops, from earlier uploads or repeated within this one, are OCR'd once
+    duplicates = {}
+    if cell_cache is not None:
+        # Results depend on how the cascade ran, so keep each configuration separate
+        # Corrections depend on the CSV's course codes, so each lexicon gets its own namespace
+        lexicon_id = lexicon.fingerprint if lexicon is not None else ''
+        cache_namespace = f"{PIPELINE_VERSION}:{backend_name}:{batch_ocr}:{early_exit}:{min_confidence}:{lexicon_id}:"
+        cache_keys = {}
+        uncached = []
+        first_index_for_key = {}
+        for index in ocr_indices:
+            key = cell_cache.make_key(gray_cells[index], cache_namespace)
+            if key in first_index_for_key:
+                duplicates[index] = first_index_for_key[key]
+                sources[index] = 'duplicate'
+                continue
+            cached = cell_cache.get(key)
+            if cached is not None:
+                results[index] = cached
+                sources[index] = 'cache'
+            else:
+                cache_keys[index] = key
+                first_index_for_key[key] = index
+                uncached.append(index)
+        ocr_indices = uncached
+    
+    if batch_ocr:
+        # Montages need every crop at once
+        cell_images = [upscale_cell(gray_cells[i]) for i in ocr_indices]
+        ocr_results = ocr_cells_batched(cell_images, backend, early_exit, min_confidence, lexicon)
+    else:
+        cell_images = [gray_cells[i] for i in ocr_indices]
+        ocr = partial(ocr_cell, backend=backend, early_exit=early_exit, min_confidence=min_confidence,
+                      lexicon=lexicon)
+        if workers > 1:
+            # Tesseract runs out-of-process or releases the GIL, so threads keep every core busy.
+            # Executor.map yields results in submission order, keeping cells in day/slot order.
+            log(f"Running cell OCR on {workers} workers...")
+            ocr_results = list(get_ocr_executor(workers).map(ocr, cell_images))
+        else:
+            ocr_results = [ocr(cell_img) for cell_img in cell_images]
+    
+    for index, result in zip(ocr_indices, ocr_results):
+        results[index] = result
+        if cell_cache is not None:
+            cell_cache.put(cache_keys[index], result)
+    for index, source_index in duplicates.items():
+        results[index] = results[source_index]
+    if cell_cache is not None:
+        stats = cell_cache.stats()
+        log(f"Cell OCR cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
     
-    # Hardcoded timing slots (12 slots excluding lunch)
-    theory_slots = [
-        "08:00-08:50", "08:55-09:45", "09:50-10:40", "10:45-11:35",
-        "11:40-12:30", "12:35-13:25", "14:00-14:50", "14:55-15:45",
-        "15:50-16:40", "16:45-17:35", "17:40-18:30", "18:35-19:25"
-    ]
+    if trace is not None:
+        trace.incr('cells', len(cells))
+        for cell_source in sources:
+            trace.incr(f'cells_{cell_source}')
     
-    lab_slots = [
-        "08:00-08:50", "08:50-09:40", "09:50-10:40", "10:40-11:30",
-        "11:40-12:30", "12:30-13:20", "14:00-14:50", "14:50-15:40",
-        "15:50-16:40", "16:40-17:30", "17:40-18:30", "18:30-19:20"
-    ]
+    for cell, (best_text, confidence, psm), cell_source in zip(cells, results, sources):
+        cell_type, (x, y, w, h) = cell[:2]
+        # Always add the cell to matrix, even if empty; grid cells also carry (day, type, slot)
+        if len(cell) > 2:
+            matrix.append((best_text, (x, y, w, h), (cell[2][0], cell_type, cell[2][1])))
+        else:
+            matrix.append((best_text, (x, y, w, h)))
+        # Callers can collect which PSM mode won for each cell
+        if details is not None:
+            details.append({'cell': (x, y, w, h), 'type': cell_type, 'psm': psm, 'confidence': confidence})
+        if trace is not None:
+            trace.record_cell(x=x, y=y, w=w, h=h, type=cell_type, psm=psm,
+                              confidence=round(confidence, 2), source=cell_source)
+        log(f"Extracted text from cell at ({x}, {y}): '{best_text}' ({cell_type}, psm {psm})")
+    
+    return matrix, timings
+
+# Hardcoded structure
+DAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
+
+# Hardcoded timing slots (12 slots excluding lunch)
+THEORY_SLOTS = [
+    "08:00-08:50", "08:55-09:45", "09:50-10:40", "10:45-11:35",
+    "11:40-12:30", "12:35-13:25", "14:00-14:50", "14:55-15:45",
+    "15:50-16:40", "16:45-17:35", "17:40-18:30", "18:35-19:25"
+]
+
+LAB_SLOTS = [
+    "08:00-08:50", "08:50-09:40", "09:50-10:40", "10:40-11:30",
+    "11:40-12:30", "12:30-13:20", "14:00-14:50", "14:50-15:40",
+    "15:50-16:40", "16:40-17:30", "17:40-18:30", "18:30-19:20"
+]
+
+# Each day is one theory row and one lab row of 12 cells
+CELLS_PER_DAY = 2 * len(THEORY_SLOTS)
+
+def map_periods_to_timings(matrix, timings, start_day=0):
+    # start_day lets a chunk of cells that begins at a later day be mapped on its own
+    days = DAYS
+    theory_slots = THEORY_SLOTS
+    lab_slots = LAB_SLOTS
     
-    print("\nStarting period mapping:")
-    print("------------------------")
+    log("\nStarting period mapping:")
+    log("------------------------")
     
     # Initialize schedules
     day_schedules = {day: [] for day in days}
     
     # Process cells in order (they're already organized by day and type)
-    current_day_index = 0
+    current_day_index = start_day
     current_slot_index = 0
     current_type = 'theory'
     
-    print(f"\nInitial state: Day={days[current_day_index]}, Type={current_type}, Slot={current_slot_index}")
+    log(f"\nInitial state: Day={days[current_day_index]}, Type={current_type}, Slot={current_slot_index}")
     
-    for cell_text, coords in matrix:
-        print(f"\nProcessing cell: '{cell_text}'")
-        print(f"Current state: Day={days[current_day_index]}, Type={current_type}, Slot={current_slot_index}")
+    for entry in matrix:
+        cell_text = entry[0]
+        log(f"\nProcessing cell: '{cell_text}'")
         
-        # Skip if we've processed all days
-        if current_day_index >= len(days):
-            print("Reached end of days, stopping")
-            break
+        if len(entry) > 2:
+            # Cells from the grid detector say exactly where they belong, so nothing is counted
+            day_index, row_type, slot_index = entry[2]
+            if day_index >= len(days):
+                log(f"Cell is past the last day (day {day_index + 1}), skipping")
+                continue
+        else:
+            log(f"Current state: Day={days[current_day_index]}, Type={current_type}, Slot={current_slot_index}")
             
-        day = days[current_day_index]
-        slots = lab_slots if current_type == 'lab' else theory_slots
-        timing = slots[current_slot_index]
+            # Skip if we've processed all days
+            if current_day_index >= len(days):
+                log("Reached end of days, stopping")
+                break
+            day_index, row_type, slot_index = current_day_index, current_type, current_slot_index
+            
+        day = days[day_index]
+        slots = lab_slots if row_type == 'lab' else theory_slots
+        timing = slots[slot_index]
         
         # Clean and validate the cell text
         cell_text = normalize_period(cell_text) if cell_text else ""
         
         # Always map the cell, even if empty or invalid
-        if cell_text and re.search(r'[A-Z]+\d+-[A-Z]{4}\d{3}[A-Z]?-[A-Z]{2,3}-AB\d-\d{3}(?:-[A-Z]+)?', cell_text):
-            print(f"✓ Valid period: {cell_text}")
+        if cell_text and PERIOD_PATTERN.search(cell_text):
+            log(f"✓ Valid period: {cell_text}")
             day_schedules[day].append((cell_text, timing))
         else:
-            print(f"ℹ Skipping invalid/empty text: '{cell_text}' but counting slot")
+            log(f"ℹ Skipping invalid/empty text: '{cell_text}' but counting slot")
+        
+        if len(entry) > 2:
+            continue
         
         # Always move to next slot
         current_slot_index += 1
@@ -346,139 +798,118 @@ def map_periods_to_timings(matrix, timings):
             current_slot_index = 0
             if current_type == 'theory':
                 current_type = 'lab'
-                print("Switching to lab row")
+                log("Switching to lab row")
             else:
                 current_type = 'theory'
                 current_day_index += 1
                 if current_day_index < len(days):
-                    print(f"Moving to next day: {days[current_day_index]}")
+                    log(f"Moving to next day: {days[current_day_index]}")
     
-    print("\nMapping complete!")
-    print("----------------")
+    log("\nMapping complete!")
+    log("----------------")
     for day in days:
-        print(f"\n{day}:")
+        log(f"\n{day}:")
         for period, timing in day_schedules[day]:
-            print(f"  {timing}: {period}")
+            log(f"  {timing}: {period}")
     
     return day_schedules
 
-def get_location(period_code):
-    # Extract location from codes like L5-BCSE301P-LO-AB1-205B-ALL or F2-BMAT202L-TH-AB3-206-ALL
-    # First try to match the full location pattern (AB1-205B)
-    match = re.search(r'(AB\d-\d{3}[A-Z]?)', period_code)
-    if match:
-        return match.group(1)
+# Every field of a period code such as L5-BCSE301P-LO-AB1-205B-ALL, in one match
+PERIOD_FIELDS = re.compile(
+    r'(?P<slot>[A-Z]+\d+)-(?P<course>[A-Z]{4}\d{3}[A-Z]?)-(?P<kind>[A-Z]{2,3})-'
+    r'(?P<block>AB\d)-(?P<room>\d{3}[A-Z]?)'
+)
+# Complete course code including L, E, P suffixes
+COURSE_CODE = re.compile(r'[A-Z]{4}\d{3}[LEP]?')
+LOCATION = re.compile(r'AB\d-\d{3}[A-Z]?')
+ROOM_BEFORE_TAIL = re.compile(r'(\d{3}[A-Z]?)(?=-[A-Z]+$)')
+BLOCK = re.compile(r'-(AB\d)-')
+
+# Parsed fields of one period code; slot, kind, block and room are None when the code is malformed
+PeriodRecord = namedtuple('PeriodRecord', ['slot', 'course', 'kind', 'block', 'room', 'location'])
+
+@lru_cache(maxsize=4096)
+def parse_period(period_code):
+    """Parse a period code once; the same codes come back for every week and every upload"""
+    course_match = COURSE_CODE.search(period_code)
+    course = course_match.group() if course_match else None
     
-    # If that fails, try to match just the room number pattern
-    match = re.search(r'(\d{3}[A-Z]?)(?=-[A-Z]+$)', period_code)
+    match = PERIOD_FIELDS.match(period_code)
     if match:
-        # Try to find the block
-        block_match = re.search(r'-(AB\d)-', period_code)
-        if block_match:
-            return f"{block_match.group(1)}-{match.group(1)}"
-        return match.group(1)
+        slot, _, kind, block, room = match.groups()
+        return PeriodRecord(slot, course, kind, block, room, f"{block}-{room}")
     
-    return "Unknown"
-
-def get_course_name(course_code, course_map):
-    # Extract complete course code including L, E, P suffixes
-    match = re.search(r'[A-Z]{4}\d{3}[LEP]?', course_code)
+    # Malformed codes: look for the location pieces anywhere, as the original parser did
+    match = LOCATION.search(period_code)
     if match:
-        extracted_code = match.group()  # Use complete extracted code
-        if extracted_code in course_map:
-            return course_map[extracted_code]
+        location = match.group()
+    else:
+        match = ROOM_BEFORE_TAIL.search(period_code)
+        if match:
+            block_match = BLOCK.search(period_code)
+            location = f"{block_match.group(1)}-{match.group(1)}" if block_match else match.group(1)
         else:
-            # Try without the suffix if the exact match wasn't found
-            base_code = re.match(r'[A-Z]{4}\d{3}', extracted_code).group()
-            if base_code in course_map:
-                return course_map[base_code]
-    return course_code
+            location = "Unknown"
+    return PeriodRecord(None, course, None, None, None, location)
+
+def get_location(period_code):
+    # Extract location from codes like L5-BCSE301P-LO-AB1-205B-ALL or F2-BMAT202L-TH-AB3-206-ALL
+    return parse_period(period_code).location
+
+def course_name_for(code, fallback, course_map):
+    # Exact code first, then the code without its L/E/P suffix
+    if code:
+        if code in course_map:
+            return course_map[code]
+        if code[:7] in course_map:
+            return course_map[code[:7]]
+    return fallback
+
+def get_course_name(course_code, course_map):
+    return course_name_for(parse_period(course_code).course, course_code, course_map)
 
 def extract_course_code(period_code):
-    # Extract complete course code including L, E, P suffixes
-    match = re.search(r'[A-Z]{4}\d{3}[LEP]?', period_code)
-    if match:
-        return match.group()
-    return None
+    return parse_period(period_code).course
 
 def display_day_schedules(day_schedules, course_map):
     if not course_map:
-        safe_print("\nWarning: No course mappings available. Displaying original codes.")
+        log("\nWarning: No course mappings available. Displaying original codes.")
         return {}
     
-    safe_print("\nDetailed Day-wise Schedules:")
+    log("\nDetailed Day-wise Schedules:")
     all_periods = {}
     
     for day, schedule in sorted(day_schedules.items()):
-        safe_print(f"\n{day}:")
+        log(f"\n{day}:")
         day_periods = []
         
-        # First create all period info objects
+        # First create all period objects
         for period_code, timing in schedule:
-            period_info = {
-                'time': timing,
-                'course_code': period_code,
-                'actual_code': extract_course_code(period_code),
-                'course_name': get_course_name(period_code, course_map),
-                'location': get_location(period_code),
-                'start_time': timing.split('-')[0],
-                'end_time': timing.split('-')[1]
-            }
-            day_periods.append(period_info)
+            record = parse_period(period_code)
+            day_periods.append(Period.from_timing(
+                period_code, record.course, course_name_for(record.course, period_code, course_map),
+                record.location, timing
+            ))
         
-        # Sort periods by time
-        day_periods.sort(key=lambda x: x['start_time'])
-        
-        # Merge consecutive lab periods
-        merged_periods = []
-        i = 0
-        while i < len(day_periods):
-            current = day_periods[i]
-            
-            # Check if this is a lab period (ends with P or E)
-            if current['actual_code'] and (current['actual_code'].endswith('P') or current['actual_code'].endswith('E')):
-                # Look ahead for consecutive lab periods of the same course
-                merged_end_time = current['end_time']
-                last_merged_idx = i
-                
-                for j in range(i + 1, len(day_periods)):
-                    next_period = day_periods[j]
-                    if (next_period['actual_code'] == current['actual_code'] and 
-                        next_period['start_time'] == merged_end_time):
-                        merged_end_time = next_period['end_time']
-                        last_merged_idx = j
-                    else:
-                        break
-                
-                if last_merged_idx > i:
-                    # Create merged period
-                    merged_period = current.copy()
-                    merged_period['time'] = f"{current['start_time']}-{merged_end_time}"
-                    # Add "Lab" to course name for merged lab periods
-                    if not merged_period['course_name'].endswith('Lab'):
-                        merged_period['course_name'] += ' Lab'
-                    merged_periods.append(merged_period)
-                    i = last_merged_idx + 1
-                    continue
-            
-            merged_periods.append(current)
-            i += 1
+        # Sort periods by time, then merge consecutive lab periods
+        day_periods.sort(key=lambda period: period.start)
+        merged_periods = merge_lab_periods(day_periods)
         
         # Ensure we store an empty array even if there are no periods
-        all_periods[day] = merged_periods
+        all_periods[day] = DaySchedule(day, merged_periods)
         
         # Display periods in a structured format
-        for period in merged_periods:
-            safe_print(f"  Time: {period['time']}")
-            safe_print(f"  Course: {period['course_name']}")
-            safe_print(f"  Code: {period['course_code']}")
-            safe_print(f"  Location: {period['location']}")
-            safe_print()  # Empty line between periods
+        for period in merged_periods if VERBOSE else ():
+            log(f"  Time: {format_minutes(period.start)}-{format_minutes(period.span_end)}")
+            log(f"  Course: {period.course_name}")
+            log(f"  Code: {period.course_code}")
+            log(f"  Location: {period.location}")
+            log()  # Empty line between periods
     
     return all_periods
 
 def read_course_codes(csv_path):
-    print("Reading course codes from CSV file...")
+    log("Reading course codes from CSV file...")
     try:
         course_map = {}
         seen_codes = set()  # Track seen codes to take only first occurrence
@@ -500,53 +931,276 @@ def read_course_codes(csv_path):
                             if len(code) > len(base_code):
                                 course_map[code] = name
         
-        print(f"\nSuccessfully loaded {len(course_map)} unique course mappings")
+        log(f"\nSuccessfully loaded {len(course_map)} unique course mappings")
         return course_map
     except Exception as e:
-        print(f"Error reading CSV file: {str(e)}")
-        print("Make sure your CSV file has at least two columns:")
-        print("Column 1: Course codes (e.g., BCSE204L, BCSE203E, BCSE308P)")
-        print("Column 2: Course names")
+        log(f"Error reading CSV file: {str(e)}")
+        log("Make sure your CSV file has at least two columns:")
+        log("Column 1: Course codes (e.g., BCSE204L, BCSE203E, BCSE308P)")
+        log("Column 2: Course names")
         return {}
 
-def main(image_path=None, csv_path=None, return_schedules=False):
-    try:
-        # Process image and get regions
-        image, gray, mask, binary = preprocess_image(image_path)
-        cells, timing_cells = get_cell_regions(mask, binary)
-        
-        if not cells:
-            raise ValueError("No cells detected in the table")
-            
-        # Extract text and map periods
-        matrix, timings = extract_text_from_cells(image, cells, timing_cells)
-        day_schedules = map_periods_to_timings(matrix, timings)
-        course_map = read_course_codes(csv_path)
+def day_chunks(cells, stream_days):
+    """Split cells into (first_day, end_day, cells) pieces: one per day when streaming, else one"""
+    # Grid cells carry their day; contour cells are counted, CELLS_PER_DAY at a time
+    cell_days = [cell[2][0] if len(cell) > 2 else index // CELLS_PER_DAY
+                 for index, cell in enumerate(cells)]
+    if not stream_days:
+        return [(0, min(len(DAYS), max(cell_days) + 1), cells)]
+    chunks = []
+    for index, day_index in enumerate(cell_days):
+        if day_index >= len(DAYS):
+            break
+        if not chunks or chunks[-1][0] != day_index:
+            chunks.append((day_index, day_index + 1, []))
+        chunks[-1][2].append(cells[index])
+    return chunks
+
+def iter_pipeline(image_path, csv_path, result_cache=None, trace=None, debug_dir=None,
+                  stream_days=False, detect_width=None, detector='contours', correct_codes=True,
+                  course_map=None, **ocr_options):
+    """
+    Run the pipeline, yielding {"type": "day", ...} events and finally {"type": "result", ...}.
+    With stream_days each day's rows are OCR'd and yielded before the next day starts;
+    otherwise every cell is OCR'd together and the days follow at the end.
+    detect_width runs cell detection on a copy no wider than that many pixels, and
+    detector='grid' infers the whole grid instead of grouping contours row by row.
+    correct_codes snaps near-miss OCR onto the period grammar and the CSV's course codes.
+    course_map skips reading csv_path when the caller already has it loaded.
+    """
+    if trace is None:
+        trace = Trace()
+    
+    # Identical uploads skip OpenCV and tesseract entirely
+    cache_key = None
+    if result_cache is not None:
+        with trace.span('result_cache_lookup'):
+            key_options = {k: v for k, v in ocr_options.items() if k not in CACHE_NEUTRAL_OPTIONS}
+            # Backends can read the same cell differently, so key on the one that will actually run
+            key_options['ocr_backend'] = get_backend(ocr_options.get('ocr_backend', 'auto')).name
+            if detect_width:
+                key_options['detect_width'] = detect_width
+            if detector != 'contours':
+                key_options['detector'] = detector
+            if not correct_codes:
+                key_options['correct_codes'] = False
+            cache_key = result_cache.make_key(image_path, csv_path, PIPELINE_VERSION, key_options)
+            cached = result_cache.get(cache_key)
+        if cached is not None:
+            trace.incr('result_cache_hits')
+            log("Using cached schedule for this image and CSV")
+            cached = schedule_from_dict(cached)
+            for day, periods in cached.items():
+                yield {"type": "day", "day": day, "periods": periods}
+            yield {"type": "result", "schedule": cached}
+            return
+        trace.incr('result_cache_misses')
+    
+    # Process image and get regions
+    with trace.span('preprocess_image'):
+        image, gray, mask, binary = preprocess_image(image_path, detect_width)
+    with trace.span('get_cell_regions'):
+        find_cells = get_grid_cells if detector == 'grid' else get_cell_regions
+        cells, timing_cells = find_cells(mask, binary, debug_dir)
+        cells = scale_cells(cells, image, mask)
+    
+    if not cells:
+        raise ValueError("No cells detected in the table")
+    
+    # The course codes are read before OCR so they can steer the corrections
+    with trace.span('read_course_codes'):
+        if course_map is None:
+            course_map = read_course_codes(csv_path)
+        lexicon = SlotLexicon.from_course_map(course_map) if correct_codes else None
+    
+    # Extract text and map periods, one day's rows at a time when streaming
+    day_results = {}
+    for start_day, end_day, chunk in day_chunks(cells, stream_days):
+        with trace.span('extract_text_from_cells'):
+            matrix, timings = extract_text_from_cells(image, chunk, timing_cells, gray=gray,
+                                                      trace=trace, lexicon=lexicon, **ocr_options)
+        with trace.span('map_periods_to_timings'):
+            day_schedules = map_periods_to_timings(matrix, timings, start_day)
         
-        # Format and return or display the schedule
-        result = display_day_schedules(day_schedules, course_map)
-        if return_schedules:
-            # Add an extra check to ensure all values are arrays
-            formatted_result = {
-                day: (periods if isinstance(periods, list) else [])
-                for day, periods in result.items()
-            }
-            print(json.dumps(formatted_result))
+        chunk_days = DAYS[start_day:end_day]
+        with trace.span('display_day_schedules'):
+            result = display_day_schedules({day: day_schedules[day] for day in chunk_days}, course_map)
+        for day in chunk_days:
+            # Make sure every value is an array
+            periods = result.get(day)
+            day_results[day] = periods if isinstance(periods, list) else DaySchedule(day)
+            yield {"type": "day", "day": day, "periods": day_results[day]}
+    
+    # Same shape as before streaming existed: every day, in sorted order, or nothing without a course map
+    formatted_result = ({day: day_results.get(day, DaySchedule(day)) for day in sorted(DAYS)}
+                        if course_map else {})
+    if cache_key is not None:
+        result_cache.put(cache_key, schedule_to_dict(formatted_result))
+    if ocr_options.get('cell_cache') is not None:
+        # Rewriting the whole file per run is too slow for the worker; the CLI saves again on exit
+        ocr_options['cell_cache'].save_if_due()
+    yield {"type": "result", "schedule": formatted_result}
+
+def run_pipeline(image_path, csv_path, result_cache=None, trace=None, debug_dir=None, **ocr_options):
+    """Run the whole pipeline and return the schedule as {day: DaySchedule of Period}"""
+    for event in iter_pipeline(image_path, csv_path, result_cache, trace, debug_dir, **ocr_options):
+        if event["type"] == "result":
+            return event["schedule"]
+
+def write_trace(trace, trace_file, trace_format='json'):
+    # Traces go to their own file (or stderr for '-') so stdout keeps only the schedule
+    output = trace.to_prometheus() if trace_format == 'prometheus' else trace.to_json() + '\n'
+    if trace_file == '-':
+        sys.stderr.write(output)
+    else:
+        with open(trace_file, 'w', encoding='utf-8') as f:
+            f.write(output)
+
+def main(image_path=None, csv_path=None, return_schedules=False, result_cache=None,
+         trace_file=None, trace_format='json', debug_dir=None, protocol='text', stream_days=False,
+         **ocr_options):
+    # In ndjson mode stdout carries only frames: stage and day events, then one result or error frame
+    ndjson = protocol == 'ndjson'
+    trace = Trace(listener=emit_frame if ndjson else None)
+    try:
+        if ndjson:
+            formatted_result = None
+            for event in iter_pipeline(image_path, csv_path, result_cache, trace, debug_dir,
+                                       stream_days, **ocr_options):
+                if event["type"] == "day" and not stream_days:
+                    continue
+                emit_frame(event)
+                if event["type"] == "result":
+                    formatted_result = schedule_to_dict(event["schedule"])
             return formatted_result
+        formatted_result = run_pipeline(image_path, csv_path, result_cache, trace, debug_dir, **ocr_options)
+        if return_schedules:
+            print(dumps_schedule(formatted_result))
+            # Callers such as calendar_sync index periods as dicts, as the result cache stores them
+            return schedule_to_dict(formatted_result)
         return None
     except Exception as e:
         error_msg = str(e)
-        if return_schedules:
+        trace.incr('errors')
+        if ndjson:
+            emit_frame({"type": "error", "error": error_msg})
+        elif return_schedules:
             print(json.dumps({"error": error_msg}))
         else:
             print(f"Error: {error_msg}", file=sys.stderr)
         return None
+    finally:
+        if trace_file:
+            write_trace(trace, trace_file, trace_format)
+
+def main_batch(spec, default_csv=None, batch_workers=1, output_path=None, result_cache=None, **ocr_options):
+    """Process every timetable matched by spec in this process; returns the number that failed"""
+    # Per-cell diagnostics from concurrent jobs would only interleave
+    set_verbose(False)
+    jobs = discover_jobs(spec, default_csv)
+    # Each course CSV is read once, however many timetables share it
+    course_map_for = lru_cache(maxsize=None)(read_course_codes)
+    
+    def process(image_path, csv_path):
+        return run_pipeline(image_path, csv_path, result_cache, course_map=course_map_for(csv_path),
+                            **ocr_options)
+    
+    output = open(output_path, 'w', encoding='utf-8') if output_path else sys.stdout
+    try:
+        succeeded, failed = run_batch(jobs, process, batch_workers, output, json_default)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Processed {len(jobs)} timetables: {succeeded} succeeded, {failed} failed", file=sys.stderr)
+    return failed
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process timetable image and course code CSV")
-    parser.add_argument("image_path", help="Path to the timetable image")
-    parser.add_argument("csv_path", help="Path to the course codes CSV file")
+    parser.add_argument("image_path", nargs='?',
+                        help="Path to the timetable image (with --batch: the course CSV shared by every image)")
+    parser.add_argument("csv_path", nargs='?', help="Path to the course codes CSV file")
     parser.add_argument("--return-schedules", action="store_true", help="Return schedules as JSON")
+    parser.add_argument("--batch-ocr", action="store_true",
+                        help="OCR all cells in one tesseract call per PSM mode instead of once per cell")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of cells to OCR in parallel (default: 1)")
+    parser.add_argument("--no-early-exit", action="store_true",
+                        help="Always run every PSM mode instead of stopping at the first valid period code")
+    parser.add_argument("--min-confidence", type=float, default=None,
+                        help="Also stop the PSM cascade once a mode reaches this average confidence")
+    parser.add_argument("--ocr-blank-cells", action="store_true",
+                        help="OCR every highlighted cell, even ones the ink check marks as blank")
+    parser.add_argument("--cache-dir", default=os.getenv('AUTOTT_CACHE_DIR'),
+                        help="Directory for cached schedules keyed by image and CSV contents")
+    parser.add_argument("--cache-max-mb", type=float, default=64,
+                        help="Maximum total size of the schedule cache in megabytes")
+    parser.add_argument("--cell-cache", default=os.getenv('AUTOTT_CELL_CACHE'),
+                        help="JSON file memoising OCR results for pixel-identical cell crops")
+    parser.add_argument("--cell-cache-size", type=int, default=20000,
+                        help="Maximum number of cell crops kept in the OCR memo")
+    parser.add_argument("--ocr-backend", choices=BACKEND_NAMES, default='auto',
+                        help="In-process tesserocr when installed (auto), or the pytesseract subprocess")
+    parser.add_argument("--trace-file",
+                        help="Write per-stage timings, OCR counters and per-cell PSM choices here ('-' for stderr)")
+    parser.add_argument("--trace-format", choices=['json', 'prometheus'], default='json',
+                        help="Format of the trace written by --trace-file")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Skip all diagnostic output; only the result (or error) is printed")
+    parser.add_argument("--debug-artifacts", metavar="DIR",
+                        help="Save detected_regions.png and other debug images into DIR")
+    parser.add_argument("--protocol", choices=['text', 'ndjson'], default='text',
+                        help="ndjson: stdout carries only JSON lines (stage events, then a result or "
+                             "error frame) and diagnostics go to stderr")
+    parser.add_argument("--detect-width", type=int, default=None,
+                        help="Find cells on a copy downscaled to this width (e.g. 1280); "
+                             "OCR still reads full-resolution cells")
+    parser.add_argument("--detector", choices=DETECTORS, default='contours',
+                        help="grid: infer the whole timetable grid from projection profiles so a "
+                             "missing row or cell cannot shift the days after it")
+    parser.add_argument("--no-code-correction", action="store_true",
+                        help="Keep raw OCR text instead of snapping near-miss codes to the CSV's course codes")
+    parser.add_argument("--batch", metavar="DIR|GLOB|MANIFEST",
+                        help="Process many timetables in one process and print one JSON line per image. "
+                             "Images use a same-named .csv next to them, else the shared CSV argument; "
+                             "a manifest (.csv/.txt rows of image,csv or .jsonl) lists pairs explicitly")
+    parser.add_argument("--batch-workers", type=int, default=os.cpu_count() or 1,
+                        help="Timetables processed concurrently in batch mode")
+    parser.add_argument("--batch-output", help="Write batch results here instead of stdout")
+    parser.add_argument("--stream", action="store_true",
+                        help="With --protocol ndjson, OCR one day at a time and emit a day frame "
+                             "as soon as each day is ready")
     args = parser.parse_args()
+    if args.batch and args.csv_path:
+        parser.error("with --batch the only positional argument is the shared course CSV")
+    if not args.batch and not args.csv_path:
+        parser.error("image_path and csv_path are required")
+
+    if args.quiet:
+        set_verbose(False)
+    if args.protocol == 'ndjson':
+        set_log_stream(sys.stderr)
+
+    result_cache = None
+    if args.cache_dir:
+        result_cache = ResultCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+
+    ocr_options = dict(
+        batch_ocr=args.batch_ocr, workers=args.workers,
+        early_exit=not args.no_early_exit, min_confidence=args.min_confidence,
+        skip_blank=not args.ocr_blank_cells,
+        cell_cache=CellOCRCache(args.cell_cache, args.cell_cache_size) if args.cell_cache else None,
+        ocr_backend=args.ocr_backend, detect_width=args.detect_width,
+        detector=args.detector, correct_codes=not args.no_code_correction
+    )
+    try:
+        if args.batch:
+            failed = main_batch(args.batch, args.image_path, args.batch_workers, args.batch_output,
+                                result_cache, **ocr_options)
+            sys.exit(1 if failed else 0)
 
-    main(args.image_path, args.csv_path, args.return_schedules)
+        main(args.image_path, args.csv_path, args.return_schedules, result_cache,
+             args.trace_file, args.trace_format, args.debug_artifacts, args.protocol, args.stream,
+             **ocr_options)
+    finally:
+        if ocr_options['cell_cache'] is not None:
+            ocr_options['cell_cache'].save()
@@ -0,0 +1,135 @@
+import ctypes
+import shlex
+import sys
+import threading
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+BACKEND_NAMES = ['auto', 'pytesseract', 'tesserocr']
+
+
+def config_path(path):
+    """
+    path as a single token of a pytesseract config string, which pytesseract splits on
+    whitespace; None when that isn't possible
+    """
+    if not any(char.isspace() for char in path):
+        return path
+    if sys.platform != 'win32':
+        return shlex.quote(path)
+    # Windows splitting keeps quotes inside the token, but the 8.3 short form of a path has no spaces
+    buffer = ctypes.create_unicode_buffer(32768)
+    if ctypes.windll.kernel32.GetShortPathNameW(path, buffer, len(buffer)) and ' ' not in buffer.value:
+        return buffer.value
+    return None
+
+
+class PytesseractBackend:
+    """Runs the tesseract binary once per call through pytesseract"""
+
+    name = 'pytesseract'
+
+    def image_to_data(self, image, psm, whitelist=None, user_words=None):
+        config = f'--psm {psm}'
+        if whitelist:
+            config += f' -c tessedit_char_whitelist={whitelist}'
+        user_words = user_words and config_path(user_words)
+        if user_words:
+            config += f' --user-words {user_words}'
+        return pytesseract.image_to_data(
+            image,
+            config=config,
+            output_type=pytesseract.Output.DICT
+        )
+
+
+class TesserocrBackend:
+    """Keeps one initialised libtesseract handle per thread and passes pixel buffers in directly"""
+
+    name = 'tesserocr'
+
+    def __init__(self, lang='eng'):
+        self.lang = lang
+        self._local = threading.local()
+
+    def _api(self, user_words=None):
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            # Loading the traineddata happens once here instead of on every call
+            api = tesserocr.PyTessBaseAPI(lang=self.lang)
+            self._local.api = api
+            self._local.user_words = None
+        if user_words != self._local.user_words:
+            # user_words_file is only read at init, so switching word lists re-initialises this handle
+            variables = {'user_words_file': user_words} if user_words else {}
+            api.InitFull(lang=self.lang, variables=variables)
+            self._local.user_words = user_words
+        return api
+
+    def _set_image(self, api, image):
+        if isinstance(image, Image.Image):
+            api.SetImage(image)
+            return
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+
+    def image_to_data(self, image, psm, whitelist=None, user_words=None):
+        api = self._api(user_words)
+        api.SetPageSegMode(psm)
+        api.SetVariable('tessedit_char_whitelist', whitelist or '')
+        self._set_image(api, image)
+        api.Recognize()
+
+        # Same word-level fields pytesseract returns, so callers don't care which backend ran
+        data = {'text': [], 'conf': [], 'left': [], 'top': [], 'width': [], 'height': []}
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+        level = tesserocr.RIL.WORD
+        for word in tesserocr.iterate_level(iterator, level):
+            try:
+                text = word.GetUTF8Text(level)
+            except RuntimeError:
+                continue
+            bounds = word.BoundingBox(level)
+            if bounds is None:
+                continue
+            x1, y1, x2, y2 = bounds
+            data['text'].append(text)
+            data['conf'].append(word.Confidence(level))
+            data['left'].append(x1)
+            data['top'].append(y1)
+            data['width'].append(x2 - x1)
+            data['height'].append(y2 - y1)
+        return data
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name='auto'):
+    """Return a shared backend instance, falling back to pytesseract when tesserocr is missing"""
+    if name not in BACKEND_NAMES:
+        raise ValueError(f"Unknown OCR backend '{name}'. Choose from: {', '.join(BACKEND_NAMES)}")
+
+    if name in ('auto', 'tesserocr') and tesserocr is None:
+        if name == 'tesserocr':
+            print("tesserocr is not installed, falling back to pytesseract", file=sys.stderr)
+        name = 'pytesseract'
+    elif name == 'auto':
+        name = 'tesserocr'
+
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = TesserocrBackend() if name == 'tesserocr' else PytesseractBackend()
+        return _backends[name]
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from atomic_file import write_atomic
+
+DEFAULT_MAX_ENTRIES = 20000
+# Seconds between writes of the cache file by save_if_due
+DEFAULT_SAVE_INTERVAL = 60
+
+
+def hash_crop(crop):
+    """Return an exact hash of a cell crop's pixels and shape"""
+    digest = hashlib.sha1()
+    digest.update(f"{crop.shape}{crop.dtype}".encode('ascii'))
+    digest.update(crop.tobytes())
+    return digest.hexdigest()
+
+
+class CellOCRCache:
+    """Bounded LRU memo of OCR results per cell crop, optionally persisted to a JSON file"""
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, save_interval=DEFAULT_SAVE_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self.last_save = time.monotonic()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        # Held across snapshot and write, so an older snapshot never overwrites a newer one
+        self._save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def make_key(crop, namespace=''):
+        """Key a crop by its pixels within a namespace describing the OCR settings"""
+        return namespace + hash_crop(crop)
+
+    def get(self, key):
+        """Return the cached (text, confidence, psm) for a key, or None"""
+        with self._lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return tuple(result)
+
+    def put(self, key, result):
+        """Remember the OCR result for a key, evicting the least recently used entries"""
+        with self._lock:
+            self.entries[key] = tuple(result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self._dirty = True
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+    def load(self):
+        """Read entries saved by an earlier run, oldest first"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load cell OCR cache from {self.path}: {str(e)}", file=sys.stderr)
+            return
+        with self._lock:
+            for key, result in saved[-self.max_entries:]:
+                self.entries[key] = tuple(result)
+
+    def save(self):
+        """Write the cache to its file if anything changed since the last save"""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                self.last_save = time.monotonic()
+                if not self._dirty:
+                    return
+                snapshot = [[key, list(result)] for key, result in self.entries.items()]
+                self._dirty = False
+            write_atomic(self.path, json.dumps(snapshot))
+
+    def save_if_due(self):
+        """Save when save_interval has passed since the last save; long-running callers use this per job"""
+        if time.monotonic() - self.last_save >= self.save_interval:
+            self.save()
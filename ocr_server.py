@@ -0,0 +1,282 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Importing the pipeline here keeps cv2, numpy, pytesseract and PIL loaded
+# for the lifetime of the worker instead of once per upload
+from main import DETECTORS, run_pipeline, set_verbose
+from result_cache import ResultCache
+from ocr_cache import CellOCRCache
+from ocr_backend import BACKEND_NAMES
+from schedule_model import json_default
+from tracing import PipelineMetrics, Trace
+
+try:
+    # Keeps the Calendar client, its connection and the token warm between syncs
+    import calendar_service
+    import calendar_sync
+except ImportError:
+    # The Google client libraries are only needed for /calendar/sync
+    calendar_service = calendar_sync = None
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_JOB_TIMEOUT = 120
+
+# The only credentials /calendar/sync will use: the project's own token.json
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class PipelineWorkerPool:
+    """Fixed set of threads draining a bounded queue of timetable jobs"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, ocr_options=None,
+                 result_cache=None):
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.ocr_options = ocr_options or {}
+        self.result_cache = result_cache
+        self.metrics = PipelineMetrics()
+        self.threads = []
+        for index in range(workers):
+            thread = threading.Thread(target=self._run, name=f"ocr-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, image_path, csv_path, trace=None):
+        """Queue a job and return a Future, or raise QueueFullError when saturated"""
+        future = Future()
+        try:
+            self.jobs.put_nowait((future, image_path, csv_path, trace or Trace()))
+        except queue.Full:
+            raise QueueFullError("Worker queue is full, try again shortly")
+        return future
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def _run(self):
+        while True:
+            future, image_path, csv_path, trace = self.jobs.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(run_pipeline(image_path, csv_path, self.result_cache,
+                                                       trace, **self.ocr_options))
+                    except Exception as e:
+                        trace.incr('errors')
+                        future.set_exception(e)
+                    finally:
+                        self.metrics.observe(trace)
+            finally:
+                self.jobs.task_done()
+
+
+class PipelineRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'AutoTTWorker/1.0'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = self.server.pool.metrics.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path != '/health':
+            self._send_json(404, {"error": "Not found"})
+            return
+        pool = self.server.pool
+        self._send_json(200, {
+            "status": "ok",
+            "workers": len(pool.threads),
+            "queued": pool.pending()
+        })
+
+    def do_POST(self):
+        if self.path not in ('/process', '/calendar/sync'):
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        try:
+            payload = self._read_json()
+        except ValueError:
+            self._send_json(400, {"error": "Request body must be JSON"})
+            return
+        if not isinstance(payload, dict):
+            self._send_json(400, {"error": "Request body must be a JSON object"})
+            return
+
+        if self.path == '/calendar/sync':
+            self._calendar_sync(payload)
+            return
+
+        image_path = payload.get('image_path')
+        csv_path = payload.get('csv_path')
+        if not image_path or not csv_path:
+            self._send_json(400, {"error": "Both image_path and csv_path are required"})
+            return
+        if not os.path.exists(image_path) or not os.path.exists(csv_path):
+            self._send_json(400, {"error": "image_path or csv_path does not exist"})
+            return
+
+        trace = Trace()
+        try:
+            future = self.server.pool.submit(image_path, csv_path, trace)
+        except QueueFullError as e:
+            self._send_json(503, {"error": str(e)})
+            return
+
+        try:
+            schedule = future.result(timeout=self.server.job_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._send_json(504, {"error": "Timed out waiting for the OCR worker"})
+            return
+        except Exception as e:
+            self._send_json(422, {"error": str(e)})
+            return
+
+        response = {"schedule": schedule}
+        # The trace rides next to the schedule, never inside it
+        if payload.get('trace'):
+            response["trace"] = trace.to_dict()
+        self._send_json(200, response)
+
+    def _calendar_sync(self, payload):
+        """Same arguments and JSON answer as `calendar_sync.py schedule.json ...`"""
+        if calendar_sync is None:
+            self._send_json(501, {"error": "Calendar sync needs the Google client libraries", "success": False})
+            return
+        schedule_path = payload.get('schedule_path')
+        if not schedule_path or not os.path.exists(schedule_path):
+            self._send_json(400, {"error": "schedule_path is required and must exist", "success": False})
+            return
+        credentials_dir = payload.get('credentials_dir') or PROJECT_ROOT
+        if os.path.realpath(credentials_dir) != os.path.realpath(PROJECT_ROOT):
+            self._send_json(403, {"error": "credentials_dir must be the project root", "success": False})
+            return
+        selected_days = payload.get('selected_days') or None
+        if isinstance(selected_days, str):
+            selected_days = selected_days.split(',')
+        # The cached Calendar connection is not thread-safe, so syncs take turns
+        with self.server.calendar_lock:
+            result = calendar_sync.sync_from_web(
+                schedule_path,
+                selected_days=selected_days,
+                is_recurring=payload.get('is_recurring', True),
+                credentials_dir=PROJECT_ROOT,
+                start_date_str=payload.get('start_date') or None
+            )
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        # Keep access logs on stderr so pipeline output stays readable
+        sys.stderr.write("%s - %s\n" % (self.address_string(), format % args))
+
+
+def create_server(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS,
+                  queue_size=DEFAULT_QUEUE_SIZE, job_timeout=DEFAULT_JOB_TIMEOUT, ocr_options=None,
+                  result_cache=None):
+    """Build the HTTP server together with its worker pool"""
+    server = ThreadingHTTPServer((host, port), PipelineRequestHandler)
+    server.daemon_threads = True
+    server.pool = PipelineWorkerPool(workers, queue_size, ocr_options, result_cache)
+    server.job_timeout = job_timeout
+    server.calendar_lock = threading.Lock()
+    if calendar_service is not None:
+        calendar_service.enable_background_refresh()
+    return server
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Run a persistent timetable OCR worker.')
+    parser.add_argument('--host', default=os.getenv('AUTOTT_WORKER_HOST', DEFAULT_HOST),
+                        help='Interface to bind (defaults to localhost only)')
+    parser.add_argument('--port', type=int, default=int(os.getenv('AUTOTT_WORKER_PORT', DEFAULT_PORT)),
+                        help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='Number of timetables processed concurrently')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='Maximum number of jobs waiting for a worker before rejecting with 503')
+    parser.add_argument('--job-timeout', type=float, default=DEFAULT_JOB_TIMEOUT,
+                        help='Seconds a request waits for its result')
+    parser.add_argument('--ocr-workers', type=int, default=1,
+                        help='Number of cells each job OCRs in parallel')
+    parser.add_argument('--batch-ocr', action='store_true',
+                        help='OCR all cells of a job in one tesseract call per PSM mode')
+    parser.add_argument('--cache-dir', default=os.getenv('AUTOTT_CACHE_DIR'),
+                        help='Directory for cached schedules keyed by image and CSV contents')
+    parser.add_argument('--cache-max-mb', type=float, default=64,
+                        help='Maximum total size of the schedule cache in megabytes')
+    parser.add_argument('--cell-cache', default=os.getenv('AUTOTT_CELL_CACHE'),
+                        help='JSON file memoising OCR results for pixel-identical cell crops')
+    parser.add_argument('--cell-cache-size', type=int, default=20000,
+                        help='Maximum number of cell crops kept in the OCR memo')
+    parser.add_argument('--ocr-backend', choices=BACKEND_NAMES, default='auto',
+                        help='In-process tesserocr when installed (auto), or the pytesseract subprocess')
+    parser.add_argument('--detect-width', type=int, default=None,
+                        help='Find cells on a copy downscaled to this width; OCR still reads full-resolution cells')
+    parser.add_argument('--detector', choices=DETECTORS, default='contours',
+                        help='grid: infer the whole timetable grid so a missing row cannot shift later days')
+    parser.add_argument('--no-code-correction', action='store_true',
+                        help="Keep raw OCR text instead of snapping near-miss codes to the CSV's course codes")
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print per-cell pipeline diagnostics (off by default)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    set_verbose(args.verbose)
+    ocr_options = {
+        'workers': args.ocr_workers,
+        'batch_ocr': args.batch_ocr,
+        'ocr_backend': args.ocr_backend,
+        'detect_width': args.detect_width,
+        'detector': args.detector,
+        'correct_codes': not args.no_code_correction
+    }
+    if args.cell_cache:
+        # One memo shared by every job, so crops repeat across students' timetables
+        ocr_options['cell_cache'] = CellOCRCache(args.cell_cache, args.cell_cache_size)
+    result_cache = None
+    if args.cache_dir:
+        result_cache = ResultCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+    server = create_server(args.host, args.port, args.workers, args.queue_size,
+                           args.job_timeout, ocr_options, result_cache)
+    print(f"OCR worker listening on http://{args.host}:{args.port} "
+          f"({args.workers} workers, queue size {args.queue_size})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if 'cell_cache' in ocr_options:
+            ocr_options['cell_cache'].save()
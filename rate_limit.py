@@ -0,0 +1,73 @@
+import json
+import random
+import threading
+import time
+
+# 403 reasons that mean "slow down" rather than "not allowed"
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 32.0
+
+
+class TokenBucket:
+    """Lets calls through at rate per second on average, with bursts of up to capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available. Callers queue up by going into debt, so a
+        request larger than the capacity (a whole batch) still goes through in turn."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def error_status(error):
+    """HTTP status of a googleapiclient HttpError (or anything with a .resp.status)"""
+    return getattr(getattr(error, 'resp', None), 'status', None)
+
+
+def error_reason(error):
+    try:
+        content = error.content.decode('utf-8') if isinstance(error.content, bytes) else error.content
+        return json.loads(content)['error']['errors'][0]['reason']
+    except Exception:
+        return None
+
+
+def is_rate_limited(error):
+    status = error_status(error)
+    return status == 429 or (status == 403 and error_reason(error) in RATE_LIMIT_REASONS)
+
+
+def backoff_delay(attempt, error=None, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+    """Exponential backoff with jitter; a Retry-After header on the error wins when it is longer"""
+    delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1)
+    resp = getattr(error, 'resp', None)
+    retry_after = resp.get('retry-after') if hasattr(resp, 'get') else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(max_delay, float(retry_after)))
+    return delay
+
+
+def call_with_backoff(call, retries=MAX_RETRIES, base_delay=BASE_DELAY):
+    """Run call(), retrying with backoff while it fails with a rate-limit error"""
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except Exception as e:
+            if attempt == retries or not is_rate_limited(e):
+                raise
+            time.sleep(backoff_delay(attempt, e, base_delay))
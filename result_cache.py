@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import threading
+
+from atomic_file import write_atomic
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of processed schedules, evicting least recently used entries first"""
+
+    def __init__(self, cache_dir, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_path, csv_path, version, options=None):
+        """Build a key from the image bytes, the CSV bytes, the pipeline version and its options"""
+        digest = hashlib.sha256()
+        digest.update(f"v{version}\n".encode('utf-8'))
+        digest.update(hash_file(image_path).encode('ascii'))
+        digest.update(hash_file(csv_path).encode('ascii'))
+        digest.update(json.dumps(options or {}, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached schedule for key, or None on a miss"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        # Bump the modification time so eviction treats this entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        """Store a schedule atomically, then trim the cache back within its limits"""
+        write_atomic(self._entry_path(key), json.dumps(value))
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until both size limits are met"""
+        with self._evict_lock:
+            entries = []
+            total_bytes = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total_bytes += stat.st_size
+
+            entries.sort()
+            while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+                _, size, name = entries.pop(0)
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+                total_bytes -= size
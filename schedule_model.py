@@ -0,0 +1,138 @@
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii as encode_string
+
+# Every clock time of a day, so formatting a time is a list lookup
+CLOCK = [f"{minutes // 60:02d}:{minutes % 60:02d}" for minutes in range(24 * 60)]
+
+
+def parse_minutes(clock):
+    """'08:50' -> 530"""
+    hours, minutes = clock.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def format_minutes(minutes):
+    """530 -> '08:50'"""
+    return CLOCK[minutes]
+
+
+@lru_cache(maxsize=256)
+def parse_timing(timing):
+    """'08:00-08:50' -> (480, 530); there are only a couple of dozen distinct slot timings"""
+    start, end = timing.split('-')
+    return parse_minutes(start), parse_minutes(end)
+
+
+class Period:
+    """One class in a day's schedule, with times as minutes since midnight"""
+
+    __slots__ = ('course_code', 'actual_code', 'course_name', 'location', 'start', 'end', 'span_end')
+
+    def __init__(self, course_code, actual_code, course_name, location, start, end, span_end=None):
+        self.course_code = course_code
+        self.actual_code = actual_code
+        self.course_name = course_name
+        self.location = location
+        self.start = start
+        self.end = end
+        # Merged labs cover several slots; 'time' shows the whole span while end_time keeps
+        # the first slot's end, as the schedule JSON always has
+        self.span_end = end if span_end is None else span_end
+
+    @classmethod
+    def from_timing(cls, course_code, actual_code, course_name, location, timing):
+        start, end = parse_timing(timing)
+        return cls(course_code, actual_code, course_name, location, start, end)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['course_code'], data['actual_code'], data['course_name'], data['location'],
+                   parse_minutes(data['start_time']), parse_minutes(data['end_time']),
+                   parse_minutes(data['time'].split('-')[1]))
+
+    @property
+    def is_lab(self):
+        return bool(self.actual_code) and self.actual_code[-1] in 'PE'
+
+    def to_dict(self):
+        start_time = CLOCK[self.start]
+        return {
+            'time': f"{start_time}-{CLOCK[self.span_end]}",
+            'course_code': self.course_code,
+            'actual_code': self.actual_code,
+            'course_name': self.course_name,
+            'location': self.location,
+            'start_time': start_time,
+            'end_time': CLOCK[self.end]
+        }
+
+    def to_json(self):
+        """Same text json.dumps(self.to_dict()) gives, without building the dict"""
+        start_time = CLOCK[self.start]
+        actual_code = 'null' if self.actual_code is None else encode_string(self.actual_code)
+        return (
+            f'{{"time": "{start_time}-{CLOCK[self.span_end]}", '
+            f'"course_code": {encode_string(self.course_code)}, "actual_code": {actual_code}, '
+            f'"course_name": {encode_string(self.course_name)}, "location": {encode_string(self.location)}, '
+            f'"start_time": "{start_time}", "end_time": "{CLOCK[self.end]}"}}'
+        )
+
+
+class DaySchedule(list):
+    """A day's periods in time order; a list, so it serialises as a plain JSON array"""
+
+    __slots__ = ('day',)
+
+    def __init__(self, day, periods=()):
+        super().__init__(periods)
+        self.day = day
+
+
+def merge_lab_periods(periods):
+    """Join back-to-back lab periods of the same course into one period spanning them"""
+    merged = []
+    i = 0
+    while i < len(periods):
+        current = periods[i]
+        if current.is_lab:
+            span_end = current.end
+            last = i
+            for j in range(i + 1, len(periods)):
+                following = periods[j]
+                if following.actual_code != current.actual_code or following.start != span_end:
+                    break
+                span_end = following.end
+                last = j
+            if last > i:
+                name = current.course_name if current.course_name.endswith('Lab') else current.course_name + ' Lab'
+                merged.append(Period(current.course_code, current.actual_code, name, current.location,
+                                     current.start, current.end, span_end))
+                i = last + 1
+                continue
+        merged.append(current)
+        i += 1
+    return merged
+
+
+def schedule_to_dict(schedule):
+    """{day: [period dict]}, the shape the API, the cache and calendar_sync use"""
+    return {day: [period.to_dict() for period in periods] for day, periods in schedule.items()}
+
+
+def schedule_from_dict(data):
+    return {day: DaySchedule(day, [Period.from_dict(period) for period in periods])
+            for day, periods in data.items()}
+
+
+def json_default(value):
+    """json.dumps hook so frames and responses can embed Period objects directly"""
+    if isinstance(value, Period):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_schedule(schedule):
+    """Serialise a {day: [Period]} schedule exactly as json.dumps(schedule_to_dict(schedule)) would"""
+    days = (f'{encode_string(day)}: [{", ".join(period.to_json() for period in periods)}]'
+            for day, periods in schedule.items())
+    return '{' + ', '.join(days) + '}'
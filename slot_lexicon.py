@@ -0,0 +1,138 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from atomic_file import write_atomic
+
+# Fields of a period code, e.g. L35-BCSE301P-LO-AB1-205B-ALL: slot, course, kind, block, room, tail
+SLOT_FIELD = re.compile(r'[A-Z]+\d+')
+COURSE_FIELD = re.compile(r'[A-Z]{4}\d{3}[A-Z]?')
+KIND_FIELD = re.compile(r'[A-Z]{2,3}')
+BLOCK_FIELD = re.compile(r'AB\d')
+ROOM_FIELD = re.compile(r'\d{3}[A-Z\d]?')
+TAIL_FIELD = re.compile(r'[A-Z]+')
+
+# Class kinds that appear in the third field
+KINDS = ['TH', 'ETH', 'ELA', 'LO', 'SS', 'EPJ', 'PJT']
+
+# Characters tesseract confuses between letters and digits
+TO_DIGIT = str.maketrans('OQDILTSBZG', '0001117826')
+TO_LETTER = str.maketrans('0125867', 'OIZSBGT')
+
+# Snap a field to a known value only when it is at most this many edits away
+MAX_COURSE_DISTANCE = 2
+MAX_KIND_DISTANCE = 1
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two short strings"""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def fix_classes(text, classes):
+    """Force each character to a letter (L) or digit (D) by position; other positions are kept"""
+    fixed = []
+    for char, char_class in zip(text, classes):
+        if char_class == 'L':
+            char = char.translate(TO_LETTER)
+        elif char_class == 'D':
+            char = char.translate(TO_DIGIT)
+        fixed.append(char)
+    return ''.join(fixed) + text[len(classes):]
+
+
+def nearest(value, candidates, max_distance):
+    """The single closest candidate within max_distance edits, or None when there is a tie"""
+    best, best_distance, tied = None, max_distance + 1, False
+    for candidate in candidates:
+        distance = edit_distance(value, candidate)
+        if distance < best_distance:
+            best, best_distance, tied = candidate, distance, False
+        elif distance == best_distance:
+            tied = True
+    return None if tied else best
+
+
+class SlotLexicon:
+    """Corrects noisy OCR of a period code against the grammar and the codes from the course CSV"""
+
+    def __init__(self, course_codes):
+        codes = {code.upper() for code in course_codes}
+        self.full_codes = sorted(code for code in codes if len(code) == 8)
+        self.base_codes = sorted({code[:7] for code in codes if len(code) >= 7})
+        self.fingerprint = hashlib.sha1('\n'.join(sorted(codes)).encode()).hexdigest()[:12]
+        self._words_path = None
+
+    @classmethod
+    def from_course_map(cls, course_map):
+        return cls(code for code in course_map if COURSE_FIELD.fullmatch(code))
+
+    def knows_course(self, course):
+        """Whether the CSV lists this course code; without a course list every code counts as known"""
+        if not self.base_codes or course in self.full_codes:
+            return True
+        if len(course) == 7:
+            return course in self.base_codes
+        # A known base code with any suffix is fine; the CSV often lists only one of L/P/E
+        return len(course) == 8 and course[:7] in self.base_codes and course[7] in 'LPE'
+
+    def correct_course(self, course):
+        if len(course) not in (7, 8):
+            return None
+        course = fix_classes(course, 'LLLLDDDL')
+        # A code that reads cleanly is kept even when the CSV doesn't list it; only text
+        # that still breaks the grammar is snapped to the nearest known code
+        if COURSE_FIELD.fullmatch(course) or not self.base_codes:
+            return course
+        candidates = self.full_codes if len(course) == 8 else self.base_codes
+        return nearest(course, candidates, MAX_COURSE_DISTANCE)
+
+    def correct(self, text):
+        """Return the corrected period code, or None when the text can't be made to fit the grammar"""
+        parts = [part for part in text.upper().split('-') if part]
+        if len(parts) not in (5, 6) or len(parts[0]) < 2:
+            return None
+        slot, course, kind, block, room = parts[:5]
+
+        # Fields that already fit the grammar are kept as read; only broken ones are repaired.
+        # Slots are letters then digits (A1, TG1, L35): only the ends are certain
+        if not SLOT_FIELD.fullmatch(slot):
+            slot = slot[0].translate(TO_LETTER) + slot[1:-1] + slot[-1].translate(TO_DIGIT)
+        course = self.correct_course(course)
+        if not KIND_FIELD.fullmatch(kind):
+            kind = nearest(kind.translate(TO_LETTER), KINDS, MAX_KIND_DISTANCE)
+        if not BLOCK_FIELD.fullmatch(block):
+            block = fix_classes(block, 'LLD')
+        if not ROOM_FIELD.fullmatch(room):
+            room = fix_classes(room, 'DDDL')
+        fields = [slot, course, kind, block, room]
+        if len(parts) == 6:
+            tail = parts[5]
+            fields.append(tail if TAIL_FIELD.fullmatch(tail) else tail.translate(TO_LETTER))
+
+        checks = [SLOT_FIELD, COURSE_FIELD, KIND_FIELD, BLOCK_FIELD, ROOM_FIELD, TAIL_FIELD]
+        for field, pattern in zip(fields, checks):
+            if field is None or (pattern is not None and not pattern.fullmatch(field)):
+                return None
+        return '-'.join(fields)
+
+    def words(self):
+        """Tokens worth adding to tesseract's dictionary for this CSV"""
+        return self.full_codes + self.base_codes + KINDS + [f"AB{block}" for block in range(1, 4)]
+
+    def words_path(self):
+        """A user-words file for tesseract, shared by every lexicon built from the same codes"""
+        if self._words_path is None:
+            path = os.path.join(tempfile.gettempdir(), f"autott-words-{self.fingerprint}.txt")
+            if not os.path.exists(path):
+                # Concurrent runs never read a half-written file
+                write_atomic(path, '\n'.join(self.words()) + '\n')
+            self._words_path = path
+        return self._words_path
@@ -0,0 +1,84 @@
+import base64
+import hashlib
+import json
+import os
+
+from atomic_file import write_atomic
+
+INDEX_FILE = 'sync_index.json'
+INDEX_VERSION = 1
+
+# extendedProperties.private keys marking an event as created by AutoTT, and for which period
+EVENT_SOURCE_PROPERTY = 'autott'
+EVENT_KEY_PROPERTY = 'autott_key'
+
+
+def event_key(day, period):
+    """
+    Identity of a period across syncs: the day, its slot and the course, e.g. MON|L35|BCSE301P.
+    An event repeating on several days joins them, e.g. MON+WED|A1|BCSE302L.
+    """
+    slot = period['course_code'].split('-')[0]
+    return f"{day}|{slot}|{period['actual_code'] or period['course_code']}"
+
+
+def event_id(key):
+    """A Calendar event id derived from the key; ids must use base32hex characters (0-9, a-v)"""
+    digest = hashlib.sha1(f"autott|{key}".encode()).digest()
+    return 'autott' + base64.b32hexencode(digest).decode().lower().rstrip('=')
+
+
+def body_hash(body):
+    """Hash of an event body leaving out which date it starts on; plan_sync compares dates separately"""
+    content = dict(body, start=dict(body['start'], dateTime=body['start']['dateTime'][11:]),
+                   end=dict(body['end'], dateTime=body['end']['dateTime'][11:]))
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def index_path(credentials_dir):
+    return os.path.join(credentials_dir, INDEX_FILE)
+
+
+def load_index(credentials_dir):
+    """
+    {key: {"id", "hash", "days", "date", "periods"}} of the events the last syncs left in the
+    calendar; "periods" holds the [day, period] pairs an event was built from.
+    """
+    try:
+        with open(index_path(credentials_dir)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != INDEX_VERSION:
+        return {}
+    return data.get('events', {})
+
+
+def save_index(credentials_dir, events):
+    # An interrupted sync never leaves a half-written index
+    write_atomic(index_path(credentials_dir), json.dumps({'version': INDEX_VERSION, 'events': events}))
+
+
+def remove_index(credentials_dir):
+    if os.path.exists(index_path(credentials_dir)):
+        os.remove(index_path(credentials_dir))
+
+
+def plan_sync(index, desired, days, pin_dates=True):
+    """
+    Diff the wanted events ({key: (days, body)}) against the index, limited to events on the given days.
+    With pin_dates off, an event that only starts on a different date counts as unchanged
+    (a weekly event synced last week already covers this week).
+    Returns (inserts, updates, deletes, unchanged) as lists of keys.
+    """
+    inserts, updates, unchanged = [], [], []
+    for key, (day, body) in desired.items():
+        entry = index.get(key)
+        if entry is None:
+            inserts.append(key)
+        elif entry['hash'] != body_hash(body) or (pin_dates and entry['date'] != body['start']['dateTime'][:10]):
+            updates.append(key)
+        else:
+            unchanged.append(key)
+    deletes = [key for key, entry in index.items() if set(entry['days']) & set(days) and key not in desired]
+    return inserts, updates, deletes, unchanged
@@ -0,0 +1,236 @@
+"""
+A fake Google Calendar v3 server for exercising calendar_sync without touching Google.
+
+It serves a discovery document for the events() methods calendar_sync uses, with rootUrl
+pointing back at itself, and answers single and batch requests from an in-memory calendar.
+An insert or update whose summary contains "FAIL" is refused with a 400, so partial failures
+can be tested, and the first `throttle` inserts or updates are refused for rate limiting.
+
+Run it on its own for manual syncs:
+  python tests/fake_calendar.py 8899
+  AUTOTT_CALENDAR_DISCOVERY_URL=http://127.0.0.1:8899/discovery
+"""
+import email
+import json
+import re
+import sys
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+EVENT_PATH = re.compile(r'/calendar/v3/calendars/([^/]+)/events(?:/([^/]+))?$')
+
+STANDARD_PARAMETERS = {
+    'alt': {'type': 'string', 'location': 'query', 'default': 'json'},
+    'fields': {'type': 'string', 'location': 'query'},
+    'prettyPrint': {'type': 'boolean', 'location': 'query'},
+}
+PATH_PARAMETER = {'type': 'string', 'required': True, 'location': 'path'}
+QUERY_PARAMETERS = {
+    'pageToken': {'type': 'string', 'location': 'query'},
+    'privateExtendedProperty': {'type': 'string', 'location': 'query', 'repeated': True},
+    'showDeleted': {'type': 'boolean', 'location': 'query'},
+    'maxResults': {'type': 'integer', 'location': 'query'},
+}
+
+
+def discovery_document(root_url):
+    def method(name, http_method, path, request=False, response='Event', query=False):
+        parameters = {'calendarId': PATH_PARAMETER}
+        if '{eventId}' in path:
+            parameters['eventId'] = PATH_PARAMETER
+        if query:
+            parameters.update(QUERY_PARAMETERS)
+        description = {
+            'id': f'calendar.events.{name}', 'path': path, 'httpMethod': http_method,
+            'parameters': parameters, 'parameterOrder': [p for p in ('calendarId', 'eventId') if p in parameters],
+        }
+        if request:
+            description['request'] = {'$ref': 'Event'}
+        if response:
+            description['response'] = {'$ref': response}
+        return description
+
+    events = 'calendars/{calendarId}/events'
+    return {
+        'kind': 'discovery#restDescription', 'discoveryVersion': 'v1', 'id': 'calendar:v3',
+        'name': 'calendar', 'version': 'v3', 'protocol': 'rest',
+        'rootUrl': root_url, 'servicePath': 'calendar/v3/', 'batchPath': 'batch/calendar/v3',
+        'baseUrl': root_url + 'calendar/v3/', 'parameters': STANDARD_PARAMETERS,
+        'schemas': {
+            'Event': {'id': 'Event', 'type': 'object'},
+            'Events': {'id': 'Events', 'type': 'object'},
+        },
+        'resources': {'events': {'methods': {
+            'insert': method('insert', 'POST', events, request=True),
+            'update': method('update', 'PUT', events + '/{eventId}', request=True),
+            'delete': method('delete', 'DELETE', events + '/{eventId}', response=None),
+            'get': method('get', 'GET', events + '/{eventId}'),
+            'list': method('list', 'GET', events, response='Events', query=True),
+        }}},
+    }
+
+
+def error(status, reason, message):
+    return status, {'error': {'code': status, 'message': message,
+                              'errors': [{'domain': 'global', 'reason': reason, 'message': message}]}}
+
+
+class FakeCalendar:
+    """The in-memory calendar, and the single and batched calls it was sent"""
+
+    def __init__(self, throttle=0):
+        self.events = {}
+        self.throttle = throttle
+        self.requests = []
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def call(self, method, path, body):
+        """Answer one events() call; returns (status, payload)"""
+        url = urlsplit(path)
+        match = EVENT_PATH.match(url.path)
+        if not match:
+            return error(404, 'notFound', f'No route for {url.path}')
+        event_id = match.group(2)
+        with self._lock:
+            if method in ('POST', 'PUT') and self.throttle:
+                self.throttle -= 1
+                return error(403, 'rateLimitExceeded', 'Rate Limit Exceeded')
+            if method == 'POST' and not event_id:
+                return self.insert(json.loads(body or '{}'))
+            if method == 'GET' and not event_id:
+                return 200, {'items': self.list(parse_qs(url.query).get('privateExtendedProperty', []))}
+            event = self.events.get(event_id)
+            if event is None or (event['status'] == 'cancelled' and method != 'DELETE'):
+                return error(404, 'notFound', 'Not Found')
+            if method == 'GET':
+                return 200, event
+            if method == 'PUT':
+                return self.update(event_id, json.loads(body or '{}'))
+            if method == 'DELETE':
+                if event['status'] == 'cancelled':
+                    return error(410, 'deleted', 'Resource has been deleted')
+                event['status'] = 'cancelled'
+                return 204, None
+        return error(405, 'notAllowed', f'{method} is not supported')
+
+    def insert(self, event):
+        if 'FAIL' in event.get('summary', ''):
+            return error(400, 'invalid', 'Bad event')
+        event.setdefault('id', uuid.uuid4().hex)
+        if event['id'] in self.events:
+            return error(409, 'duplicate', 'The requested identifier already exists.')
+        event.update(status='confirmed', htmlLink=f"http://calendar.invalid/event?eid={event['id']}")
+        self.events[event['id']] = event
+        return 200, event
+
+    def update(self, event_id, event):
+        if 'FAIL' in event.get('summary', ''):
+            return error(400, 'invalid', 'Bad event')
+        event.update(id=event_id, status='confirmed')
+        self.events[event_id] = event
+        return 200, event
+
+    def list(self, properties):
+        items = [event for event in self.events.values() if event['status'] != 'cancelled']
+        for prop in properties:
+            name, _, value = prop.partition('=')
+            items = [event for event in items
+                     if event.get('extendedProperties', {}).get('private', {}).get(name) == value]
+        return items
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length).decode('utf-8') if length else ''
+
+    def respond(self, status, payload, content_type='application/json'):
+        if payload is None:
+            data = b''
+        elif isinstance(payload, bytes):
+            data = payload
+        else:
+            data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_request(self, method):
+        calendar = self.server.calendar
+        body = self.read_body()
+        if self.path == '/discovery':
+            return self.respond(200, discovery_document(f'http://127.0.0.1:{self.server.server_port}/'))
+        if self.path == '/token':
+            return self.respond(200, {'access_token': 'fake-' + uuid.uuid4().hex[:8], 'expires_in': 3600,
+                                      'token_type': 'Bearer'})
+        if self.path.startswith('/batch/'):
+            return self.batch(body)
+        calendar.requests.append((method, self.path))
+        self.respond(*calendar.call(method, self.path, body))
+
+    def batch(self, body):
+        """Answer a multipart/mixed batch request part by part, as Google does"""
+        message = email.message_from_string(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n{body}")
+        boundary = 'batch_' + uuid.uuid4().hex
+        calls = []
+        parts = []
+        for part in message.get_payload():
+            head, _, call_body = part.get_payload().replace('\r\n', '\n').partition('\n\n')
+            method, path, _ = head.split('\n')[0].split(' ')
+            calls.append((method, path))
+            status, payload = self.server.calendar.call(method, path, call_body)
+            text = '' if payload is None else json.dumps(payload)
+            content_id = part['Content-ID'].replace('<', '<response-', 1)
+            parts.append(f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n'
+                         f'HTTP/1.1 {status} Status\r\nContent-Type: application/json\r\n'
+                         f'Content-Length: {len(text)}\r\n\r\n{text}\r\n')
+        self.server.calendar.batches.append(calls)
+        self.respond(200, (''.join(parts) + f'--{boundary}--\r\n').encode('utf-8'),
+                     f'multipart/mixed; boundary={boundary}')
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+
+class FakeCalendarServer(ThreadingHTTPServer):
+    """Serves a FakeCalendar on 127.0.0.1 from a background thread; port 0 picks a free port"""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, calendar=None):
+        super().__init__(('127.0.0.1', port), Handler)
+        self.calendar = calendar or FakeCalendar()
+        self.url = f'http://127.0.0.1:{self.server_port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8899
+    print(f"Fake Calendar server on http://127.0.0.1:{port}, discovery document at /discovery")
+    FakeCalendarServer(port).serve_forever()
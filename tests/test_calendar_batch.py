@@ -0,0 +1,74 @@
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import build_http
+
+import calendar_sync
+from calendar_sync import execute_event_calls_batch, execute_event_calls_concurrent
+from fake_calendar import FakeCalendarServer, discovery_document
+from rate_limit import TokenBucket
+
+
+@pytest.fixture
+def server():
+    with FakeCalendarServer() as server:
+        yield server
+
+
+@pytest.fixture
+def service(server):
+    return build_from_document(discovery_document(server.url + '/'), http=build_http())
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(calendar_sync, 'backoff_delay', lambda *args: 0)
+
+
+def insert_calls(summaries):
+    return [('insert', {'body': {'id': f'event{index}', 'summary': summary}})
+            for index, summary in enumerate(summaries)]
+
+
+def unlimited():
+    return TokenBucket(1000, 1000)
+
+
+def test_calls_are_grouped_into_batches_of_fifty(server, service):
+    calls = insert_calls(f'Class {index}' for index in range(120))
+    results = execute_event_calls_batch(service, calls, bucket=unlimited())
+
+    assert [len(batch) for batch in server.calendar.batches] == [50, 50, 20]
+    assert not server.calendar.requests
+    assert [response['id'] for response, _ in results] == [f'event{index}' for index in range(120)]
+    assert all(error is None for _, error in results)
+
+
+def test_failed_calls_are_reported_on_their_own(server, service):
+    calls = insert_calls(['Maths', 'FAIL Physics', 'Chemistry', 'FAIL Biology'])
+    results = execute_event_calls_batch(service, calls, bucket=unlimited())
+
+    assert [error is None for _, error in results] == [True, False, True, False]
+    assert calendar_sync.error_status(results[1][1]) == 400
+    assert sorted(server.calendar.events) == ['event0', 'event2']
+
+
+def test_rate_limited_calls_are_sent_again_in_a_later_batch(server, service):
+    server.calendar.throttle = 2
+    results = execute_event_calls_batch(service, insert_calls(['A', 'B', 'C']), bucket=unlimited())
+
+    assert [len(batch) for batch in server.calendar.batches] == [3, 2]
+    assert all(error is None for _, error in results)
+    assert len(server.calendar.events) == 3
+
+
+def test_one_request_per_call_without_batches(server, service):
+    calls = insert_calls(['Maths', 'FAIL Physics', 'Chemistry']) + [('delete', {'eventId': 'missing'})]
+    results = execute_event_calls_concurrent(service, calls, Credentials('fake-token'), workers=2,
+                                             bucket=unlimited())
+
+    assert not server.calendar.batches
+    assert sorted(method for method, _ in server.calendar.requests) == ['DELETE', 'POST', 'POST', 'POST']
+    assert [calendar_sync.error_status(error) for _, error in results] == [None, 400, None, 404]
+    assert results[2][0]['summary'] == 'Chemistry'
+
@@ -0,0 +1,57 @@
+import os
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from main import DAYS, THEORY_SLOTS, get_grid_cells
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BORDER = 6
+CELL_WIDTH = 60
+
+
+def draw_grid(row_heights, header=40):
+    """Highlight mask and binary image for a grid with one row per height; a negative height is a blank row"""
+    height = header + BORDER + sum(abs(h) + BORDER for h in row_heights)
+    width = len(THEORY_SLOTS) * (CELL_WIDTH + BORDER) + BORDER
+    mask = np.zeros((height, width), dtype=np.uint8)
+    binary = np.zeros_like(mask)
+    binary[:header] = 255
+    top = header + BORDER
+    for row_height in row_heights:
+        if row_height > 0:
+            for slot in range(len(THEORY_SLOTS)):
+                left = BORDER + slot * (CELL_WIDTH + BORDER)
+                mask[top:top + row_height, left:left + CELL_WIDTH] = 255
+        top += abs(row_height) + BORDER
+    return mask, binary
+
+
+def cells_per_row(cells):
+    return Counter((day_index, cell_type) for cell_type, _, (day_index, _) in cells)
+
+
+def test_rows_of_different_heights_keep_their_day():
+    # Wrapped codes make some rows about twice as tall as the one-line rows
+    heights = [40, 19, 40, 40, 19, 19, 40, 19, 40, 40, 19, 19, 19, 17]
+    cells, _ = get_grid_cells(*draw_grid(heights))
+    expected = {(day, kind): len(THEORY_SLOTS) for day in range(len(DAYS)) for kind in ('theory', 'lab')}
+    assert cells_per_row(cells) == expected
+
+
+def test_blank_rows_do_not_shift_later_days():
+    heights = [-40, 19, 40, 40, 19, -19, 40, 19, 40, 40, -19, -19, 19, 17]
+    cells, _ = get_grid_cells(*draw_grid(heights))
+    rows = cells_per_row(cells)
+    assert set(rows) == ({(day, kind) for day in range(len(DAYS)) for kind in ('theory', 'lab')} -
+                         {(0, 'theory'), (2, 'lab'), (5, 'theory'), (5, 'lab')})
+    assert set(rows.values()) == {len(THEORY_SLOTS)}
+
+
+def test_detected_regions_fixture():
+    image = cv2.imread(os.path.join(ROOT, 'detected_regions.png'))
+    mask = (image.min(axis=2) > 200).astype(np.uint8) * 255
+    cells, _ = get_grid_cells(mask, np.zeros_like(mask))
+    days = Counter(day_index for _, _, (day_index, _) in cells)
+    assert days == {day: 2 * len(THEORY_SLOTS) for day in range(len(DAYS))}
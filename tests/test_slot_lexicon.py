@@ -0,0 +1,39 @@
+import pytest
+
+from main import correct_cell_text
+from slot_lexicon import SlotLexicon
+
+
+@pytest.fixture
+def lexicon():
+    return SlotLexicon(['BCSE301L', 'BCSE301P', 'BMAT202L'])
+
+
+@pytest.mark.parametrize('text', [
+    'A1-BCSE301L-TH-AB1-205-ALL',
+    'L35-BCSE301P-LO-AB1-205B-ALL',
+    'A1-BCSE301L-SE-AB1-205-ALL',
+    'A1-BCSE301L-TH-AB1-3051-ALL',
+    'TG1-BMAT202L-ETH-AB3-101',
+])
+def test_valid_cells_pass_through_untouched(lexicon, text):
+    assert correct_cell_text(text, lexicon) == text
+    assert lexicon.correct(text) == text
+
+
+def test_well_formed_course_missing_from_csv_is_kept(lexicon):
+    assert correct_cell_text('A1-BCSE303L-TH-AB1-205-ALL', lexicon) == 'A1-BCSE303L-TH-AB1-205-ALL'
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('A1-BCSE3O1L-TH-AB1-205-ALL', 'A1-BCSE301L-TH-AB1-205-ALL'),
+    ('A1-BC#E301L-TH-AB1-205-ALL', 'A1-BCSE301L-TH-AB1-205-ALL'),
+    ('A1-BCSE301L-T#-AB1-205-ALL', 'A1-BCSE301L-TH-AB1-205-ALL'),
+    ('A1-BCSE301L-TH-A81-2O5-ALL', 'A1-BCSE301L-TH-AB1-205-ALL'),
+])
+def test_near_misses_are_corrected(lexicon, text, expected):
+    assert correct_cell_text(text, lexicon) == expected
+
+
+def test_text_that_cannot_fit_the_grammar_is_left_alone(lexicon):
+    assert correct_cell_text('LUNCH', lexicon) == 'LUNCH'
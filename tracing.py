@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Trace:
+    """Per-request timings, counters and per-cell OCR decisions, kept apart from the schedule"""
+
+    def __init__(self, listener=None):
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.cells = []
+        # Optional callable receiving a stage event dict whenever a span starts or ends
+        self.listener = listener
+        self._lock = threading.Lock()
+
+    def _elapsed_ms(self, moment):
+        return round((moment - self.started) * 1000, 3)
+
+    @contextmanager
+    def span(self, name):
+        """Time a pipeline stage"""
+        start = time.perf_counter()
+        if self.listener is not None:
+            self.listener({"type": "stage", "stage": name, "status": "start",
+                           "at_ms": self._elapsed_ms(start)})
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            span = {
+                "name": name,
+                "start_ms": self._elapsed_ms(start),
+                "duration_ms": round((end - start) * 1000, 3)
+            }
+            with self._lock:
+                self.spans.append(span)
+            if self.listener is not None:
+                self.listener({"type": "stage", "stage": name, "status": "end",
+                               "at_ms": self._elapsed_ms(end), "duration_ms": span["duration_ms"]})
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_cell(self, **fields):
+        with self._lock:
+            self.cells.append(fields)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+                "spans": list(self.spans),
+                "counters": dict(self.counters),
+                "cells": list(self.cells)
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def to_prometheus(self, prefix='autott'):
+        """Render this trace as Prometheus text exposition"""
+        metrics = PipelineMetrics(prefix)
+        metrics.observe(self)
+        return metrics.to_prometheus()
+
+
+class CountingBackend:
+    """Wraps an OCR backend so every engine call is counted on a trace"""
+
+    def __init__(self, backend, trace):
+        self.backend = backend
+        self.trace = trace
+        self.name = backend.name
+
+    def image_to_data(self, image, psm, whitelist=None, user_words=None):
+        self.trace.incr('ocr_calls')
+        self.trace.incr(f'ocr_calls_psm_{psm}')
+        return self.backend.image_to_data(image, psm, whitelist, user_words)
+
+
+class PipelineMetrics:
+    """Cumulative counters and stage timings across many traces, for a /metrics endpoint"""
+
+    def __init__(self, prefix='autott'):
+        self.prefix = prefix
+        self.requests = 0
+        self.counters = {}
+        self.stage_seconds = {}
+        self.stage_count = {}
+        self._lock = threading.Lock()
+
+    def observe(self, trace):
+        data = trace.to_dict()
+        with self._lock:
+            self.requests += 1
+            for name, value in data["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for span in data["spans"]:
+                name = span["name"]
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0) + span["duration_ms"] / 1000
+                self.stage_count[name] = self.stage_count.get(name, 0) + 1
+
+    def to_prometheus(self):
+        with self._lock:
+            lines = [
+                f"# TYPE {self.prefix}_requests_total counter",
+                f"{self.prefix}_requests_total {self.requests}"
+            ]
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {self.prefix}_{name}_total counter")
+                lines.append(f"{self.prefix}_{name}_total {value}")
+            if self.stage_seconds:
+                lines.append(f"# TYPE {self.prefix}_stage_seconds summary")
+            for name in sorted(self.stage_seconds):
+                lines.append(f'{self.prefix}_stage_seconds_sum{{stage="{name}"}} {self.stage_seconds[name]:.6f}')
+                lines.append(f'{self.prefix}_stage_seconds_count{{stage="{name}"}} {self.stage_count[name]}')
+        return '\n'.join(lines) + '\n'